@@ -7,6 +7,7 @@ from fastapi.security import APIKeyCookie
 from app import crud, schemas
 from app.core import exceptions
 from app.core.security import verify_access_token
+from app.util import team_cache, user_cache
 
 oauth2_scheme = APIKeyCookie(name="access_token")
 
@@ -23,7 +24,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         username = payload.get("sub")
         if username is None:
             raise exceptions.TOKEN_INVALID
-        user = await crud.user.query(name=username).first_or_none()
+        user = await user_cache.get_user_by_name(username)
         if user is None:
             raise exceptions.USER_NOT_EXIST
     except Exception as e:
@@ -34,7 +35,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 async def get_current_team(
     user: schemas.user.DoUser = Depends(get_current_user),
 ):
-    teams = await crud.team.query(user_id=user.user_id).to_list()
+    team_ids = await team_cache.get_user_team_ids(user.user_id)
+    teams = await crud.team.query(team_id=list(team_ids)).to_list()
 
     return teams
 
@@ -1,14 +1,19 @@
+import hashlib
+import mimetypes
 import time
 from datetime import timedelta
 from pathlib import Path
-from io import BytesIO
+from typing import IO
+from uuid import uuid4
 
-import magic
-import httpx
-from fastapi import APIRouter, Body, Depends, Response, UploadFile, File
+from fastapi import APIRouter, Body, Depends, Query, Request, Response, UploadFile, File
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
 from app import crud, models, schemas
 from app.api import deps
+from app.client.http import http_client
 from app.client.minio import minio
 from app.core import exceptions
 from app.core.config import settings
@@ -16,6 +21,21 @@ from app.db.session import redis_session
 
 router = APIRouter(prefix="/file", tags=["file"])
 
+# 计算哈希时每次读取的大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(fp: IO[bytes]) -> tuple[str, int]:
+    """
+    分块计算文件的 sha256 和大小
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    while chunk := fp.read(HASH_CHUNK_SIZE):
+        sha256.update(chunk)
+        size += len(chunk)
+    return sha256.hexdigest(), size
+
 
 @router.post(
     "/file_upload",
@@ -32,37 +52,109 @@ async def file_upload(
     if await redis_session.zcard(f"file:upload:limit:{user.user_id}") > 60:
         raise exceptions.FILE_UPLOAD_LIMIT
 
-    db_file = await crud.file.create(
-        obj_in=models.file.FileCreate(
-            creator_id=user.user_id,
-        )
+    # 先在本地临时文件上计算哈希，内容已存在时直接复用
+    sha256, size = await run_in_threadpool(hash_file, file.file)
+    await file.seek(0)
+
+    content_type = (
+        file.content_type
+        or mimetypes.guess_type(file.filename or "")[0]
+        or "application/octet-stream"
     )
 
-    data = await file.read()
+    file_id = uuid4()
+    exist_file = await crud.file.query(sha256=sha256).first_or_none()
+    if exist_file and exist_file.path:
+        path = exist_file.path
+    else:
+        path = f"{settings.ENVIRONMENT}/file_upload/{file_id}{Path(file.filename or '').suffix}"
+        # 直接从临时文件分片上传，不在内存中保留整个文件
+        await minio.put_object(path, file.file, length=size, content_type=content_type)
 
-    minio.client.put_object(
-        settings.MINIO_BUCKET,
-        f"{settings.ENVIRONMENT}/file_upload/{db_file.file_id}{Path(file.filename or '').suffix}",
-        BytesIO(data),
-        length=len(data),
+    await crud.file.create(
+        obj_in=models.file.FileCreate(
+            file_id=file_id,
+            creator_id=user.user_id,
+            sha256=sha256,
+            size=size,
+            content_type=content_type,
+            path=path,
+        )
     )
 
     return {
-        "get_path": f"/api/v1/file/file_preview/{settings.ENVIRONMENT}/file_upload/{db_file.file_id}{Path(file.filename or '').suffix}",
+        "get_path": f"/api/v1/file/file_preview/{path}",
     }
 
 
+# 需要转发给对象存储的请求头
+PREVIEW_FORWARD_HEADERS = ["range", "if-none-match", "if-modified-since"]
+# 需要返回给客户端的响应头
+PREVIEW_RESPONSE_HEADERS = [
+    "content-length",
+    "content-range",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+    "content-encoding",
+]
+# 文件预览缓存时间，文件上传后不会修改
+PREVIEW_CACHE_CONTROL = "public, max-age=86400"
+
+
 @router.get(
     "/file_preview/{path:path}",
     summary="获取文件预览",
-    description="获取文件预览",
+    description="获取文件预览，支持 Range 请求；redirect 为 true 时重定向到预签名地址",
 )
-async def file_preview(path: str):
-    url = minio.client.presigned_get_object(
-        settings.MINIO_BUCKET, path, expires=timedelta(days=1)
+async def file_preview(
+    path: str,
+    request: Request,
+    redirect: bool = Query(default=settings.FILE_PREVIEW_REDIRECT),
+):
+    if redirect:
+        return RedirectResponse(
+            minio.public_presigned_get_object(path, expires=timedelta(days=1)),
+            status_code=302,
+            headers={"Cache-Control": "private, max-age=3600"},
+        )
+
+    url = await minio.presigned_get_object(path, expires=timedelta(days=1))
+    resp = await http_client.send(
+        http_client.build_request(
+            "GET",
+            url,
+            headers={
+                k: v for k, v in request.headers.items() if k in PREVIEW_FORWARD_HEADERS
+            },
+        ),
+        stream=True,
+    )
+
+    headers = {
+        k: v for k, v in resp.headers.items() if k in PREVIEW_RESPONSE_HEADERS
+    }
+    headers["cache-control"] = PREVIEW_CACHE_CONTROL
+
+    if resp.status_code == 304:
+        await resp.aclose()
+        return Response(status_code=304, headers=headers)
+
+    if resp.status_code >= 400 and resp.status_code != 416:
+        await resp.aclose()
+        if resp.status_code == 404:
+            raise exceptions.FILE_NOT_EXIST
+        raise exceptions.SERVER_ERROR
+
+    # 优先使用上传时保存的类型，旧文件根据后缀推断
+    media_type = resp.headers.get("content-type")
+    if not media_type or media_type == "application/octet-stream":
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    return StreamingResponse(
+        resp.aiter_raw(),
+        status_code=resp.status_code,
+        headers=headers,
+        media_type=media_type,
+        background=BackgroundTask(resp.aclose),
     )
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url)
-    data = resp.content
-    mimetype = magic.from_buffer(data[:1024], mime=True)
-    return Response(data, media_type=mimetype)
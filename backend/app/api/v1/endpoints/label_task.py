@@ -9,6 +9,11 @@ from fastapi import APIRouter, Body, Depends
 from app import crud, models, schemas
 from app.api import deps
 from app.core import exceptions
+from app.util import choice_stats, dispatch, lease, progress, team_cache
+from app.util.stats import build_evaluation_index
+
+# 领取数据的重试次数
+DATA_CLAIM_RETRY = 3
 
 router = APIRouter(prefix="/task/label", tags=["label_task"])
 
@@ -25,12 +30,10 @@ async def list_label_task(
 ) -> schemas.task.RespListTask:
     with sentry_sdk.start_transaction(op="task", name="list label task"):
         with sentry_sdk.start_span(description="get teams"):
-            teams = await crud.team.query(user_id=user.user_id).to_list()
-            if not teams:
+            team_ids = list(await team_cache.get_user_team_ids(user.user_id))
+            if not team_ids:
                 raise exceptions.SERVER_ERROR
 
-        team_ids = [team.team_id for team in teams]
-
         with sentry_sdk.start_span(description="get task total"):
             total = await crud.label_task.query(
                 status=[schemas.task.TaskStatus.OPEN, schemas.task.TaskStatus.DONE],
@@ -57,91 +60,62 @@ async def list_label_task(
         # 统计任务进度
         # 任务id
         task_ids = [task.task_id for task in tasks]
-        # 未结束的任务id
-        open_task_ids = [
-            task.task_id
-            for task in tasks
-            if task.status == schemas.task.TaskStatus.OPEN
-        ]
         # 已完成的题数
         completed_count_map: defaultdict = defaultdict(int)
         # 剩余的题数
         remain_count_map: defaultdict = defaultdict(int)
-        # 已完成的题目id
-        questionnaire_ids_map = {i.task_id: set() for i in tasks}
-
-        # 已提交的记录
-        with sentry_sdk.start_span(description="get submit record"):
-            async for record in crud.record.query(
-                task_id=task_ids,
-                user_id=user.user_id,
-                is_submit=True,
-            ):
-                completed_count_map[record.task_id] += 1
-                questionnaire_ids_map[record.task_id].add(record.questionnaire_id)
+        # 未提交记录的问卷id
+        unsubmitted_questionnaire_ids_map: defaultdict = defaultdict(list)
 
-        # 待提交的记录
-        with sentry_sdk.start_span(description="get not submit record"):
-            async for record in crud.record.query(
+        # 用户在各任务下的记录
+        with sentry_sdk.start_span(description="count user record"):
+            async for task_record in crud.record.query(
                 task_id=task_ids,
                 user_id=user.user_id,
-                is_submit=False,
-            ):
-                remain_count_map[record.task_id] += 1
-                questionnaire_ids_map[record.task_id].add(record.questionnaire_id)
-
-        # 统计剩余题数
-        with sentry_sdk.start_span(description="count task remain"):
-            async for task_remain in crud.data.query(
-                task_id=task_ids,
-                status=schemas.data.DataStatus.PENDING,
             ).aggregate(
                 [
                     {
                         "$group": {
-                            "_id": {
-                                "task_id": "$task_id",
-                                "questionnaire_id": "$questionnaire_id",
+                            "_id": "$task_id",
+                            "completed": {
+                                "$sum": {
+                                    "$cond": [{"$gt": ["$submit_time", None]}, 1, 0]
+                                }
                             },
-                        }
-                    },
-                    {
-                        "$group": {
-                            "_id": "$_id.task_id",
-                            "remain": {"$sum": 1},
-                        }
-                    },
-                ],
-                projection_model=schemas.task.ViewTaskRemain,
-            ):
-                remain_count_map[task_remain.task_id] += task_remain.remain
-
-        # 把已经做过的题目从剩余题数中减去
-        for task in tasks:
-            async for task_remain in crud.data.query(
-                task_id=task.task_id,
-                questionnaire_id=list(questionnaire_ids_map[task.task_id]),
-                status=schemas.data.DataStatus.PENDING,
-            ).aggregate(
-                [
-                    {
-                        "$group": {
-                            "_id": {
-                                "task_id": "$task_id",
-                                "questionnaire_id": "$questionnaire_id",
+                            "unsubmitted": {
+                                "$sum": {
+                                    "$cond": [{"$gt": ["$submit_time", None]}, 0, 1]
+                                }
+                            },
+                            # 未提交的记录在过期后会被回收，数量有限
+                            "unsubmitted_questionnaire_ids": {
+                                "$addToSet": {
+                                    "$cond": [
+                                        {"$gt": ["$submit_time", None]},
+                                        None,
+                                        "$questionnaire_id",
+                                    ]
+                                }
                             },
-                        }
-                    },
-                    {
-                        "$group": {
-                            "_id": "$_id.task_id",
-                            "remain": {"$sum": 1},
                         }
                     },
                 ],
-                projection_model=schemas.task.ViewTaskRemain,
+                projection_model=schemas.task.ViewTaskUserRecord,
             ):
-                remain_count_map[task_remain.task_id] -= task_remain.remain
+                completed_count_map[task_record.task_id] = task_record.completed
+                # 待提交的记录计入剩余题数
+                remain_count_map[task_record.task_id] = task_record.unsubmitted
+                unsubmitted_questionnaire_ids_map[task_record.task_id] = [
+                    v for v in task_record.unsubmitted_questionnaire_ids if v is not None
+                ]
+
+        # 统计剩余题数，排除已经做过和正在做的问卷
+        with sentry_sdk.start_span(description="count task remain"):
+            remain = await dispatch.count_remain_questionnaires(
+                task_ids, user.user_id, unsubmitted_questionnaire_ids_map
+            )
+            for task_id, count in remain.items():
+                remain_count_map[task_id] += count
 
         resp = schemas.task.RespListTask(
             list=[
@@ -177,13 +151,11 @@ async def get_label_task(
     if task.status != schemas.task.TaskStatus.OPEN:
         raise exceptions.TASK_STATUS_NOT_ALLOW
 
-    teams = await crud.team.query(user_id=user.user_id).to_list()
-    if not teams:
+    team_ids = await team_cache.get_user_team_ids(user.user_id)
+    if not team_ids:
         raise exceptions.SERVER_ERROR
 
-    team_ids = [team.team_id for team in teams]
-
-    if len(set(team_ids).intersection(set(task.teams))) == 0:
+    if team_ids.isdisjoint(task.teams):
         raise exceptions.USER_PERMISSION_DENIED
 
     resp = schemas.task.RespGetLabelTask(
@@ -215,12 +187,10 @@ async def get_data(
         raise exceptions.TASK_STATUS_NOT_ALLOW
 
     # 检查用户是否有权限
-    teams = await crud.team.query(user_id=user.user_id).to_list()
-    if not teams:
+    team_ids = await team_cache.get_user_team_ids(user.user_id)
+    if not team_ids:
         raise exceptions.SERVER_ERROR
-
-    team_ids = [team.team_id for team in teams]
-    if len(set(team_ids).intersection(set(task.teams))) == 0:
+    if team_ids.isdisjoint(task.teams):
         raise exceptions.USER_PERMISSION_DENIED
 
     # 获取用户未完成的数据
@@ -251,39 +221,68 @@ async def get_data(
             remain_time=task.expire_time + record.create_time,
         )
 
-    # 获取用户已完成的数据
-    items = (
-        await crud.record.query(
-            task_id=req.task_id,
-            user_id=user.user_id,
-            is_submit=True,
+    # 保证用户已完成问卷集合可用
+    await dispatch.ensure_done_questionnaires(req.task_id, user.user_id)
+
+    # 优先从分发队列中领取数据，队列中可能存在已被领取的数据，需要重试
+    data = None
+    for _ in range(DATA_CLAIM_RETRY):
+        dispatch_items = await dispatch.pop_dispatch_queue(
+            req.task_id, user.user_id
         )
-        .project(schemas.task.ViewQuestionnaireID)
-        .to_list()
-    )
+        if dispatch_items is None:
+            break
+        if not dispatch_items:
+            raise exceptions.DATA_BALANCE_NOT_ENOUGH
 
-    # 随机获取一个未完成的数据
-    datas = (
-        await crud.data.query(
-            task_id=req.task_id,
-            status=schemas.data.DataStatus.PENDING,
-            not_questionnaire_id=[item.questionnaire_id for item in items],
+        data_id, _ = dispatch_items[0]
+        data = await crud.data.claim(
+            data_id=data_id,
+            from_status=schemas.data.DataStatus.PENDING,
+            to_status=schemas.data.DataStatus.PROCESSING,
         )
-        .aggregate(
-            [
-                {"$sample": {"size": 1}},
-            ],
-            projection_model=models.data.Data,
+        if data:
+            break
+
+    # 分发队列不可用时，随机抽取一个未完成的数据领取
+    if not data:
+        done_questionnaire_ids = await dispatch.get_done_questionnaires(
+            req.task_id, user.user_id
         )
-        .to_list()
-    )
-    if not datas:
+        for _ in range(DATA_CLAIM_RETRY):
+            candidates = (
+                await crud.data.query(
+                    task_id=req.task_id,
+                    status=schemas.data.DataStatus.PENDING,
+                    not_questionnaire_id=list(done_questionnaire_ids),
+                )
+                .aggregate(
+                    [
+                        {"$sample": {"size": 1}},
+                        {"$project": {"data_id": 1}},
+                    ],
+                    projection_model=schemas.task.ViewDataID,
+                )
+                .to_list()
+            )
+            if not candidates:
+                raise exceptions.DATA_BALANCE_NOT_ENOUGH
+
+            data = await crud.data.claim(
+                data_id=candidates[0].data_id,
+                from_status=schemas.data.DataStatus.PENDING,
+                to_status=schemas.data.DataStatus.PROCESSING,
+            )
+            if data:
+                break
+
+    if not data:
         raise exceptions.DATA_BALANCE_NOT_ENOUGH
 
-    data = datas[0]
-    await crud.data.update(
-        db_obj=data,
-        obj_in=models.data.DataUpdate(status=schemas.data.DataStatus.PROCESSING),
+    await progress.move(
+        data.task_id,
+        schemas.data.DataStatus.PENDING,
+        schemas.data.DataStatus.PROCESSING,
     )
     record = await crud.record.create(
         obj_in=models.record.RecordCreate(
@@ -293,6 +292,7 @@ async def get_data(
             creator_id=user.user_id,
         )
     )
+    await lease.add_leases([record], task.expire_time)
     resp = schemas.data.RespGetData(
         questionnaire_id=data.questionnaire_id,
         data_id=data.data_id,
@@ -308,6 +308,191 @@ async def get_data(
     return resp
 
 
+async def claim_data_batch(
+    task_id: UUID,
+    user_id: str,
+    count: int,
+    exclude_questionnaire_ids: set[UUID],
+) -> list[models.data.Data]:
+    """
+    为用户批量领取最多 count 条数据，同一问卷只领取一条
+    """
+    claimed: list[models.data.Data] = []
+
+    def claimed_questionnaire_ids() -> set[UUID]:
+        return exclude_questionnaire_ids | {data.questionnaire_id for data in claimed}
+
+    # 优先从分发队列中领取数据，队列中可能存在已被领取的数据，需要重试
+    use_fallback = False
+    for _ in range(DATA_CLAIM_RETRY):
+        remain = count - len(claimed)
+        if remain <= 0:
+            break
+
+        dispatch_items = await dispatch.pop_dispatch_queue(
+            task_id,
+            user_id,
+            count=remain,
+            exclude_questionnaire_ids=claimed_questionnaire_ids(),
+        )
+        if dispatch_items is None:
+            use_fallback = True
+            break
+        if not dispatch_items:
+            break
+
+        claimed.extend(
+            await crud.data.claim_many(
+                data_ids=[data_id for data_id, _ in dispatch_items],
+                from_status=schemas.data.DataStatus.PENDING,
+                to_status=schemas.data.DataStatus.PROCESSING,
+            )
+        )
+
+    # 分发队列不可用时，随机抽取未完成的数据领取
+    if use_fallback:
+        done_questionnaire_ids = await dispatch.get_done_questionnaires(
+            task_id, user_id
+        )
+        for _ in range(DATA_CLAIM_RETRY):
+            remain = count - len(claimed)
+            if remain <= 0:
+                break
+
+            candidates = (
+                await crud.data.query(
+                    task_id=task_id,
+                    status=schemas.data.DataStatus.PENDING,
+                    not_questionnaire_id=list(
+                        done_questionnaire_ids | claimed_questionnaire_ids()
+                    ),
+                )
+                .aggregate(
+                    [
+                        {"$sample": {"size": remain}},
+                        {"$project": {"data_id": 1, "questionnaire_id": 1}},
+                    ],
+                    projection_model=schemas.data.ViewDispatchData,
+                )
+                .to_list()
+            )
+            if not candidates:
+                break
+
+            # 同一问卷只领取一条
+            candidate_map = {
+                candidate.questionnaire_id: candidate.data_id
+                for candidate in candidates
+            }
+            claimed.extend(
+                await crud.data.claim_many(
+                    data_ids=list(candidate_map.values()),
+                    from_status=schemas.data.DataStatus.PENDING,
+                    to_status=schemas.data.DataStatus.PROCESSING,
+                )
+            )
+
+    await progress.move(
+        task_id,
+        schemas.data.DataStatus.PENDING,
+        schemas.data.DataStatus.PROCESSING,
+        len(claimed),
+    )
+
+    return claimed
+
+
+@router.post(
+    "/data/get_batch",
+    summary="批量获取数据",
+    description="批量获取数据",
+    response_model=schemas.data.RespGetDataBatch,
+)
+async def get_data_batch(
+    req: schemas.task.ReqGetDataBatch = Body(...),
+    user: schemas.user.DoUser = Depends(deps.get_current_user),
+) -> schemas.data.RespGetDataBatch:
+    # 看任务是否存在
+    task = await crud.label_task.query(task_id=req.task_id).first_or_none()
+    if not task:
+        raise exceptions.TASK_NOT_EXIST
+
+    if task.status != schemas.task.TaskStatus.OPEN:
+        raise exceptions.TASK_STATUS_NOT_ALLOW
+
+    # 检查用户是否有权限
+    team_ids = await team_cache.get_user_team_ids(user.user_id)
+    if not team_ids:
+        raise exceptions.SERVER_ERROR
+    if team_ids.isdisjoint(task.teams):
+        raise exceptions.USER_PERMISSION_DENIED
+
+    # 获取用户未完成的数据
+    records = await crud.record.query(
+        task_id=req.task_id,
+        user_id=user.user_id,
+        create_time_gt=int(time.time()) - task.expire_time,
+        is_submit=False,
+        limit=req.count,
+    ).to_list()
+    datas = (
+        await crud.data.query(data_id=[record.data_id for record in records]).to_list()
+        if records
+        else []
+    )
+
+    # 不足的部分批量领取
+    if len(records) < req.count:
+        await dispatch.ensure_done_questionnaires(req.task_id, user.user_id)
+        claimed = await claim_data_batch(
+            req.task_id,
+            user.user_id,
+            req.count - len(records),
+            {record.questionnaire_id for record in records},
+        )
+        if claimed:
+            new_records = await crud.record.create_many(
+                obj_in=[
+                    models.record.RecordCreate(
+                        data_id=data.data_id,
+                        task_id=data.task_id,
+                        questionnaire_id=data.questionnaire_id,
+                        creator_id=user.user_id,
+                    )
+                    for data in claimed
+                ]
+            )
+            await lease.add_leases(new_records, task.expire_time)
+            records.extend(new_records)
+            datas.extend(claimed)
+
+    if not records:
+        raise exceptions.DATA_BALANCE_NOT_ENOUGH
+
+    data_map = {data.data_id: data for data in datas}
+    resp = schemas.data.RespGetDataBatch(
+        list=[
+            schemas.data.RespGetData(
+                questionnaire_id=data_map[record.data_id].questionnaire_id,
+                data_id=record.data_id,
+                prompt=data_map[record.data_id].prompt,
+                conversation=[
+                    schemas.message.MessageBase.model_validate(
+                        message, from_attributes=True
+                    )
+                    for message in data_map[record.data_id].conversation
+                ],
+                reference_evaluation=data_map[record.data_id].reference_evaluation,
+                remain_time=task.expire_time + record.create_time,
+            )
+            for record in records
+            if record.data_id in data_map
+        ]
+    )
+
+    return resp
+
+
 @router.post(
     "/data/release",
     summary="释放数据",
@@ -338,10 +523,19 @@ async def release_data(
         raise exceptions.DATA_NOT_BELONG_TO_USER
 
     await crud.record.remove(record.id)
-    await crud.data.update(
-        db_obj=data,
-        obj_in=models.data.DataUpdate(status=schemas.data.DataStatus.PENDING),
+    await lease.remove_leases([record])
+    released_data = await crud.data.claim(
+        data_id=data.data_id,
+        from_status=schemas.data.DataStatus.PROCESSING,
+        to_status=schemas.data.DataStatus.PENDING,
     )
+    if released_data:
+        await progress.move(
+            task.task_id,
+            schemas.data.DataStatus.PROCESSING,
+            schemas.data.DataStatus.PENDING,
+        )
+        await dispatch.push_dispatch_queue(task.task_id, [released_data])
 
 
 @router.put(
@@ -373,15 +567,26 @@ async def commit_data(
     if not record:
         raise exceptions.DATA_NOT_BELONG_TO_USER
 
+    # 重复提交时原来的评价已经计入统计
+    old_evaluation = (
+        data.evaluation.model_copy()
+        if data.status == schemas.data.DataStatus.COMPLETED
+        else None
+    )
     evaluation = data.evaluation
     evaluation.message_evaluation = req.message_evaluation
     evaluation.conversation_evaluation = req.conversation_evaluation
     evaluation.questionnaire_evaluation = req.questionnaire_evaluation
 
+    await progress.move(
+        task.task_id, data.status, schemas.data.DataStatus.COMPLETED
+    )
     await crud.data.update(
         db_obj=data,
         obj_in=models.data.DataUpdate(
-            status=schemas.data.DataStatus.COMPLETED, evaluation=evaluation
+            status=schemas.data.DataStatus.COMPLETED,
+            evaluation=evaluation,
+            evaluation_index=build_evaluation_index(evaluation),
         ),
     )
     await crud.record.update(
@@ -392,6 +597,12 @@ async def commit_data(
             status=schemas.record.RecordStatus.COMPLETED,
         ),
     )
+    await progress.touch(task.task_id)
+    await choice_stats.update(task, old_evaluation, evaluation)
+    await lease.remove_leases([record])
+    await dispatch.add_done_questionnaire(
+        task.task_id, user.user_id, data.questionnaire_id
+    )
 
 
 @router.post(
@@ -1,20 +1,16 @@
 import random
 import tempfile
 import zipfile
-import io
 import urllib.parse
-from operator import itemgetter
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import AsyncGenerator
 from uuid import UUID
 
-import orjson
 from beanie.operators import PullAll
 from fastapi import APIRouter, Body, Depends, Query
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import StreamingResponse
 from loguru._logger import Logger
-from openpyxl import Workbook
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from redis.exceptions import LockError
 
@@ -25,7 +21,8 @@ from app.core import exceptions
 from app.core.config import settings
 from app.db.session import redis_session
 from app.scheduler import scheduler
-from app.scheduler.task import label_task_scheduler_job, task_scheduler_job_name
+from app.scheduler.task import task_scheduler_job_name
+from app.util import choice_stats, dispatch, export, export_job, parquet, progress
 
 router = APIRouter(prefix="/task/label")
 
@@ -51,6 +48,7 @@ async def create_label_task(
             expire_time=req.expire_time,
         )
     )
+    await progress.init_progress(task.task_id)
 
     resp = schemas.task.DoTaskBase(task_id=task.task_id)
 
@@ -145,6 +143,7 @@ async def derive_label_task(
                 expire_time=item.expire_time,
             )
         )
+        await progress.init_progress(new_task.task_id)
         new_datas = [
             models.data.DataCreate(
                 task_id=new_task.task_id,
@@ -162,7 +161,8 @@ async def derive_label_task(
             for data in datas
         ]
 
-        await crud.data.create_many(obj_in=new_datas)
+        created_datas = await crud.data.create_many(obj_in=new_datas)
+        await progress.add_datas(new_task.task_id, created_datas)
         await update_label_task(
             req=schemas.operator.task.ReqLabelTaskUpdate(
                 task_id=new_task.task_id,
@@ -221,7 +221,8 @@ async def copy_label_task(
                 for data in copy_task_data
             ]
 
-            await crud.data.create_many(obj_in=datas)
+            created_datas = await crud.data.create_many(obj_in=datas)
+            await progress.add_datas(task_resp.task_id, created_datas)
     except Exception as e:
         print(e)
         return schemas.task.RespCopyTask(is_ok=False, msg="创建数据失败")
@@ -274,18 +275,19 @@ async def update_label_task(
         ),
     )
 
-    # 定时任务处理
+    # 统计的问题随任务配置变化
+    if req.tool_config:
+        await choice_stats.remove(task.task_id)
+
+    # 过期数据由 task_sweeper_job 统一回收，这里只维护分发队列
     if req.status == schemas.task.TaskStatus.OPEN:
-        scheduler.add_job(
-            label_task_scheduler_job,
-            "interval",
-            args=[task.task_id],
-            seconds=30,
-            id=task_scheduler_job_name(task_id=task.task_id),
-        )
+        await dispatch.build_dispatch_queue(task.task_id)
     elif req.status == schemas.task.TaskStatus.DONE:
+        # 清理历史版本为每个任务注册的定时任务
         if scheduler.get_job(task_scheduler_job_name(task_id=task.task_id)):
             scheduler.remove_job(task_scheduler_job_name(task_id=task.task_id))
+        await dispatch.remove_dispatch_queue(task.task_id)
+        await dispatch.remove_done_questionnaires(task.task_id)
 
     resp = schemas.task.DoTaskBase(task_id=task.task_id)
 
@@ -381,113 +383,7 @@ async def list_label_task(
     user_name_map = {user.user_id: user.name for user in users or []}
 
     # 获取任务完成情况
-    task_ids = [task.task_id for task in tasks]
-    data_count = (
-        await crud.data.query(task_id=task_ids)
-        .aggregate(
-            [
-                {
-                    "$group": {
-                        "_id": "$task_id",
-                        "completed": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.COMPLETED,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "total": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$in": [
-                                            "$source_data_id",
-                                            [
-                                                None,
-                                            ],
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "pending": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.PENDING,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "labeling": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.PROCESSING,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "labeled": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$in": [
-                                            "$status",
-                                            [
-                                                schemas.data.DataStatus.COMPLETED,
-                                                schemas.data.DataStatus.DISCARDED,
-                                            ],
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "discarded": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.DISCARDED,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                    }
-                }
-            ],
-            projection_model=schemas.operator.task.ViewTaskProgressCount,
-        )
-        .to_list()
-    )
-    pending_map = {item.task_id: item.pending for item in data_count or []}
-    labeling_map = {item.task_id: item.labeling for item in data_count or []}
-    total_map = {item.task_id: item.total for item in data_count or []}
+    progress_map = await progress.get_progress([task.task_id for task in tasks])
 
     resp = schemas.operator.task.RespListLabelTask(
         total=total,
@@ -498,10 +394,8 @@ async def list_label_task(
                 status=task.status,
                 creator=user_name_map.get(task.creator_id, ""),
                 created_time=task.create_time,
-                completed_count=total_map.get(task.task_id, 0)
-                - pending_map.get(task.task_id, 0)
-                - labeling_map.get(task.task_id, 0),
-                total_count=total_map.get(task.task_id, 0),
+                completed_count=progress_map[task.task_id].completed,
+                total_count=progress_map[task.task_id].total,
             )
             for task in tasks
         ],
@@ -530,121 +424,7 @@ async def get_label_task(
     teams = await crud.team.query(team_id=task.teams).to_list()
     teams_map = {team.team_id: team for team in teams or []}
 
-    data_count = (
-        await crud.data.query(task_id=task.task_id)
-        .aggregate(
-            [
-                {
-                    "$group": {
-                        "_id": "$task_id",
-                        "completed": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.COMPLETED,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "total": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$in": [
-                                            "$source_data_id",
-                                            [
-                                                None,
-                                            ],
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "pending": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.PENDING,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "labeling": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.PROCESSING,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "labeled": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$in": [
-                                            "$status",
-                                            [
-                                                schemas.data.DataStatus.COMPLETED,
-                                                schemas.data.DataStatus.DISCARDED,
-                                            ],
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                        "discarded": {
-                            "$sum": {
-                                "$cond": [
-                                    {
-                                        "$eq": [
-                                            "$status",
-                                            schemas.data.DataStatus.DISCARDED,
-                                        ]
-                                    },
-                                    1,
-                                    0,
-                                ]
-                            }
-                        },
-                    }
-                }
-            ],
-            projection_model=schemas.operator.task.ViewTaskProgressCount,
-        )
-        .to_list()
-    )
-    if not data_count:
-        task_progress = schemas.operator.task.LabelTaskProgress(
-            completed=0,
-            total=0,
-            pending=0,
-            labeling=0,
-            labeled=0,
-            discarded=0,
-            label_time=0,
-        )
-    else:
-        task_progress = data_count[0]
+    task_progress = (await progress.get_progress([task.task_id]))[task.task_id]
 
     # 获取用户分布
     labeling_users_set = set()
@@ -693,9 +473,7 @@ async def get_label_task(
             for team_id in task.teams or []
         ],
         progress=schemas.operator.task.LabelTaskProgress(
-            completed=task_progress.total
-            - task_progress.pending
-            - task_progress.labeling,
+            completed=task_progress.completed,
             total=task_progress.total,
             pending=task_progress.pending,
             labeling=task_progress.labeling,
@@ -746,17 +524,22 @@ async def delete_label_task(
                     async for record in crud.record.query(task_id=req.task_id):
                         f.write((record.model_dump_json() + "\n").encode("utf-8"))
 
+            length = fp.tell()
             fp.seek(0)
-            minio.minio.client.put_object(
-                settings.MINIO_BUCKET,
+            await minio.minio.put_object(
                 f"{settings.ENVIRONMENT}task_backup/{req.task_id}.zip",
                 fp,
-                length=fp.tell(),
+                length=length,
+                content_type="application/zip",
             )
 
     await crud.label_task.remove(task.id)
     await crud.data.query(task_id=req.task_id).delete()
     await crud.record.query(task_id=req.task_id).delete()
+    await dispatch.remove_dispatch_queue(req.task_id)
+    await dispatch.remove_done_questionnaires(req.task_id)
+    await progress.remove_progress(req.task_id)
+    await choice_stats.remove(req.task_id)
 
     return {}
 
@@ -790,7 +573,10 @@ async def batch_create_data(
         for _ in range(task.distribute_count)
     ]
 
-    await crud.data.create_many(obj_in=tasks)
+    datas = await crud.data.create_many(obj_in=tasks)
+    await progress.add_datas(task.task_id, datas)
+    if task.status == schemas.task.TaskStatus.OPEN:
+        await dispatch.push_dispatch_queue(task.task_id, datas)
 
     return
 
@@ -813,6 +599,8 @@ async def clear_data(
         raise exceptions.TASK_STATUS_NOT_ALLOW
 
     await crud.data.query(task_id=req.task_id).delete()
+    await progress.rebuild_progress([req.task_id])
+    await choice_stats.remove(req.task_id)
 
 
 @router.post(
@@ -879,19 +667,62 @@ async def reject_data(
                         models.data.Data.status: schemas.data.DataStatus.DISCARDED,
                     }
                 )  # type: ignore
+                status_count = defaultdict(int)
+                for data in datas:
+                    status_count[data.status] += 1
+                for status, count in status_count.items():
+                    await progress.move(
+                        task.task_id,
+                        status,
+                        schemas.data.DataStatus.DISCARDED,
+                        count,
+                    )
+                for data in datas:
+                    if data.status == schemas.data.DataStatus.COMPLETED:
+                        await choice_stats.update(task, data.evaluation, None)
                 await crud.record.query(
                     task_id=req.task_id, data_id=new_data_ids, user_id=req.user_id
                 ).set(
                     {models.record.Record.status: schemas.record.RecordStatus.DISCARDED}
                 )  # type: ignore
+                await progress.touch(task.task_id)
+                await dispatch.remove_done_questionnaires(
+                    task.task_id, list({record.creator_id for record in records})
+                )
                 if req.is_data_recreate:
-                    await crud.data.create_many(obj_in=new_datas)
+                    recreated_datas = await crud.data.create_many(obj_in=new_datas)
+                    await progress.add_datas(task.task_id, recreated_datas)
+                    if task.status == schemas.task.TaskStatus.OPEN:
+                        await dispatch.push_dispatch_queue(
+                            task.task_id, recreated_datas
+                        )
 
             return
     except LockError:
         raise exceptions.SERVER_ERROR
 
 
+async def export_response(
+    req: schemas.operator.task.ReqCreateExportJob,
+) -> StreamingResponse:
+    tasks = await export_job.load_tasks(req.task_id)
+    if not tasks:
+        raise exceptions.TASK_NOT_EXIST
+    if req.export_format == schemas.operator.task.ExportFormat.PARQUET:
+        parquet.ensure_available()
+
+    user_names = None
+    if req.kind == schemas.operator.task.ExportKind.RECORD:
+        user_names = await export_job.load_user_names()
+
+    filename = urllib.parse.quote(export_job.export_filename(req, tasks))
+    return StreamingResponse(
+        content=export_job.export_content(req, tasks, user_names),
+        media_type="application/octet-stream" if len(tasks) == 1 else "application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
 @router.get(
     "/data/export",
     summary="导出数据",
@@ -903,100 +734,19 @@ async def export_data(
     submit: schemas.operator.task.SubmitStatus | None = Query(None),
     qualified: schemas.operator.task.QualifiedStatus | None = Query(None),
     invalid: bool | None = Query(None),
+    export_format: schemas.operator.task.ExportFormat = Query(
+        schemas.operator.task.ExportFormat.JSONL, description="导出格式"
+    ),
 ):
-    task_count = await crud.label_task.query(task_id=task_id).count()
-    if task_count == 0:
-        raise exceptions.TASK_NOT_EXIST
-
-    status = None
-    if submit is not None:
-        if submit == schemas.operator.task.SubmitStatus.SUBMITTED:
-            status = [
-                schemas.data.DataStatus.COMPLETED,
-                schemas.data.DataStatus.DISCARDED,
-            ]
-        elif submit == schemas.operator.task.SubmitStatus.UN_SUBMITTED:
-            status = [
-                schemas.data.DataStatus.PENDING,
-                schemas.data.DataStatus.PROCESSING,
-            ]
-
-    if qualified is not None:
-        if qualified == schemas.operator.task.QualifiedStatus.COMPLETED:
-            if status is None:
-                status = [schemas.data.DataStatus.COMPLETED]
-            else:
-                status = list(set(status) & {schemas.data.DataStatus.COMPLETED})
-        elif qualified == schemas.operator.task.QualifiedStatus.DISCARDED:
-            if status is None:
-                status = [schemas.data.DataStatus.DISCARDED]
-            else:
-                status = list(set(status) & {schemas.data.DataStatus.DISCARDED})
-
-    async def export_stream_data(task_id) -> AsyncGenerator:
-        datas = ""
-        index = 0
-        async for data in crud.data.query(
-            task_id=task_id, status=status, invalid=invalid
-        ):
-            index += 1
-            datas += (
-                schemas.data.DoData.model_validate(
-                    data, from_attributes=True
-                ).model_dump_json()
-                + "\n"
-            )
-
-            if index % 100 == 0:
-                yield datas
-                datas = ""
-
-        if datas:
-            yield datas
-
-    async def zip_generator(task_id: list[UUID]) -> AsyncGenerator[bytes, None]:
-        tasks = await crud.label_task.query(task_id=task_id).to_list()
-        task_h = {task.task_id: task for task in tasks}
-        title_set = set()
-        title_map = {}
-        with io.BytesIO() as zip_buffer:
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                for tid in task_id:
-                    data_buffer = io.StringIO()
-                    async for chunk in export_stream_data(tid):
-                        data_buffer.write(chunk)
-                    data_buffer.seek(0)
-                    if task_h[tid].title not in title_set:
-                        title_set.add(task_h[tid].title)
-                        title = task_h[tid].title
-                        title_map[title] = 1
-                    else:
-                        title = f"{task_h[tid].title}({title_map[task_h[tid].title]})"
-                        title_map[task_h[tid].title] += 1
-                    zip_file.writestr(f"{title}.jsonl", data_buffer.read())
-
-            zip_buffer.seek(0)
-            yield zip_buffer.read()
-
-    if task_count == 1:
-        task = await crud.label_task.query(task_id=task_id).first_or_none()
-        if not task:
-            raise exceptions.TASK_NOT_EXIST
-        filename = urllib.parse.quote(task.title)
-        resp = StreamingResponse(
-            content=export_stream_data(task_id),
-            media_type="application/octet-stream",
-            headers={"Content-Disposition": f"attachment; filename={filename}.jsonl"},
-        )
-    else:
-        resp = StreamingResponse(
-            content=zip_generator(task_id),  # type: ignore
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename={datetime.now(tz=timezone(timedelta(hours=8))).strftime('%Y%m%d%H%M%S')}.zip"
-            },
-        )
-    return resp
+    req = schemas.operator.task.ReqCreateExportJob(
+        kind=schemas.operator.task.ExportKind.DATA,
+        task_id=task_id if isinstance(task_id, list) else [task_id],
+        export_format=export_format,
+        submit=submit,
+        qualified=qualified,
+        invalid=invalid,
+    )
+    return await export_response(req)
 
 
 @router.post(
@@ -1033,77 +783,41 @@ async def list_by_questionnaire_id(
 )
 async def export_record(
     task_id: UUID | list[UUID] = Query(...),
+    export_format: schemas.operator.task.ExportFormat = Query(
+        schemas.operator.task.ExportFormat.JSONL, description="导出格式"
+    ),
 ):
-    task_count = await crud.label_task.query(task_id=task_id).count()
-    if task_count == 0:
-        raise exceptions.TASK_NOT_EXIST
+    req = schemas.operator.task.ReqCreateExportJob(
+        kind=schemas.operator.task.ExportKind.RECORD,
+        task_id=task_id if isinstance(task_id, list) else [task_id],
+        export_format=export_format,
+    )
+    return await export_response(req)
 
-    user_name_map = defaultdict(str)
-    async for user in crud.user.query():
-        user_name_map[user.user_id] = user.name
-
-    async def export_stream_data(task_id) -> AsyncGenerator:
-        records = ""
-        index = 0
-        async for record in crud.record.query(task_id=task_id, is_submit=True):
-            index += 1
-            do_record = schemas.record.DoRecord.model_validate(
-                record, from_attributes=True
-            )
-            record_dict = do_record.model_dump()
-            record_dict["creator"] = user_name_map[do_record.creator_id]
-            records += orjson.dumps(record_dict).decode("utf-8") + "\n"
 
-            if index % 100 == 0:
-                yield records
-                records = ""
+@router.post(
+    "/export/create",
+    summary="创建导出任务",
+    description="在后台导出数据或标注记录，相同的导出请求在任务数据没有变化时复用导出结果",
+    response_model=schemas.operator.task.RespExportJob,
+)
+async def create_export_job(
+    req: schemas.operator.task.ReqCreateExportJob = Body(...),
+) -> schemas.operator.task.RespExportJob:
+    return await export_job.create_job(req)
 
-        if records:
-            yield records
-
-    async def zip_generator(task_id: list[UUID]) -> AsyncGenerator[bytes, None]:
-        tasks = await crud.label_task.query(task_id=task_id).to_list()
-        task_h = {task.task_id: task for task in tasks}
-        title_set = set()
-        title_map = {}
-        with io.BytesIO() as zip_buffer:
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                for tid in task_id:
-                    data_buffer = io.StringIO()
-                    async for chunk in export_stream_data(tid):
-                        data_buffer.write(chunk)
-                    data_buffer.seek(0)
-                    if task_h[tid].title not in title_set:
-                        title_set.add(task_h[tid].title)
-                        title = task_h[tid].title
-                        title_map[title] = 1
-                    else:
-                        title = f"{task_h[tid].title}({title_map[task_h[tid].title]})"
-                        title_map[task_h[tid].title] += 1
-                    zip_file.writestr(f"{title}.jsonl", data_buffer.read())
-            zip_buffer.seek(0)
-            yield zip_buffer.read()
-
-    if task_count == 1:
-        task = await crud.label_task.query(task_id=task_id).first_or_none()
-        if not task:
-            raise exceptions.TASK_NOT_EXIST
-        filename = urllib.parse.quote(task.title)
-        resp = StreamingResponse(
-            content=export_stream_data(task_id),
-            media_type="application/octet-stream",
-            headers={"Content-Disposition": f"attachment; filename={filename}.jsonl"},
-        )
-    else:
-        resp = StreamingResponse(
-            content=zip_generator(task_id),  # type: ignore
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename={datetime.now(tz=timezone(timedelta(hours=8))).strftime('%Y%m%d%H%M%S')}.zip"
-            },
-        )
 
-    return resp
+@router.get(
+    "/export/{job_id}",
+    summary="导出任务详情",
+    description="导出任务状态和进度，完成后返回支持断点续传的下载地址",
+    response_model=schemas.operator.task.RespExportJob,
+)
+async def get_export_job(job_id: UUID) -> schemas.operator.task.RespExportJob:
+    job = await export_job.get_job(job_id)
+    if not job:
+        raise exceptions.EXPORT_JOB_NOT_EXIST
+    return job
 
 
 # 导出工作量
@@ -1111,35 +825,62 @@ async def export_record(
     "/data/export_workload",
     summary="导出工作量",
     description="导出工作量",
-    response_class=Response,
+    response_class=StreamingResponse,
 )
 async def export_workload(
     task_id: UUID | list[UUID] = Query(...),
+    start_time: int | None = Query(None, description="提交时间起始（秒级时间戳，包含）"),
+    end_time: int | None = Query(None, description="提交时间结束（秒级时间戳，不包含）"),
+    export_format: schemas.operator.task.WorkloadExportFormat = Query(
+        schemas.operator.task.WorkloadExportFormat.XLSX, description="导出格式"
+    ),
 ):
-    task_count = await crud.label_task.query(task_id=task_id).count()
-    if task_count == 0:
+    tasks = await crud.label_task.query(task_id=task_id).to_list()
+    if not tasks:
         raise exceptions.TASK_NOT_EXIST
+    task_h = {task.task_id: task for task in tasks}
 
-    # 用户答题总数
-    task_user_data_count: defaultdict = defaultdict(int)
-    # 用户未达标题数
-    task_user_data_discarded_count: defaultdict = defaultdict(int)
-    # 用户答题总时长（秒）
-    task_user_data_duration: defaultdict = defaultdict(int)
-    # 用户id set
-    task_user_ids_set: set[tuple[UUID, str]] = set()
-
-    async for record in crud.record.query(task_id=task_id, is_submit=True):
-        key = (record.task_id, record.creator_id)
-        task_user_ids_set.add(key)
-        task_user_data_count[key] += 1
-        task_user_data_duration[key] += (
-            (record.submit_time - record.create_time) if record.submit_time else 0
+    # 按任务和用户汇总答题数、未达标题数和答题时长（秒）
+    workloads = (
+        await crud.record.query(
+            task_id=task_id,
+            is_submit=True,
+            submit_time_gte=start_time,
+            submit_time_lt=end_time,
         )
-        if record.status == schemas.data.DataStatus.DISCARDED:
-            task_user_data_discarded_count[key] += 1
+        .aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": {"task_id": "$task_id", "creator_id": "$creator_id"},
+                        "count": {"$sum": 1},
+                        "discarded": {
+                            "$sum": {
+                                "$cond": [
+                                    {
+                                        "$eq": [
+                                            "$status",
+                                            schemas.record.RecordStatus.DISCARDED,
+                                        ]
+                                    },
+                                    1,
+                                    0,
+                                ]
+                            }
+                        },
+                        "duration": {
+                            "$sum": {"$subtract": ["$submit_time", "$create_time"]}
+                        },
+                    }
+                },
+                {"$sort": {"_id.task_id": 1, "_id.creator_id": 1}},
+            ],
+            projection_model=schemas.task.ViewTaskUserWorkload,
+        )
+        .to_list()
+    )
 
-    user_ids = list(set([user_id for _, user_id in task_user_ids_set]))
+    user_ids = list({workload.id.creator_id for workload in workloads})
     users = await crud.user.query(user_id=user_ids).to_list()
     user_name_map = {user.user_id: user.name for user in users}
 
@@ -1149,9 +890,6 @@ async def export_workload(
         for t_user in team.users:
             user_teams[t_user.user_id].append(team.name)
 
-    tasks = await crud.label_task.query(task_id=task_id).to_list()
-    task_h = {task.task_id: task for task in tasks}
-
     headers = [
         "任务ID",
         "任务名称",
@@ -1164,49 +902,38 @@ async def export_workload(
         "未达标题数",
         "未达标率",
     ]
-    colummns: list[list[str]] = []
-    for task_id, user_id in task_user_ids_set:
-        key = (task_id, user_id)
-        colummns.append(
-            [
-                str(task_id),
-                task_h[task_id].title,
-                user_id,
-                user_name_map[user_id] if user_id in user_name_map else "",
-                ",".join(user_teams[user_id]) if user_id in user_teams else "",
-                f"{(task_user_data_count[key] / task_user_data_duration[key] * 60 * 60):.2f}",
-                f"{(task_user_data_duration[key]/60/60):.4f}",
-                task_user_data_count[key],
-                task_user_data_discarded_count[key],
-                f"{(task_user_data_discarded_count[key]/task_user_data_count[key]*100):.2f}%",
-            ]
-        )
-
-    colummns = sorted(colummns, key=itemgetter(0, 2))
-
-    # 生成excel
-    wb = Workbook()
-    ws = wb.active
-    ws.append(headers)  # type: ignore
-    for row in colummns:
-        ws.append(row)  # type: ignore
+    rows = [
+        [
+            str(workload.id.task_id),
+            task_h[workload.id.task_id].title,
+            workload.id.creator_id,
+            user_name_map.get(workload.id.creator_id, ""),
+            ",".join(user_teams[workload.id.creator_id]),
+            f"{(workload.count / workload.duration * 60 * 60 if workload.duration else 0):.2f}",
+            f"{(workload.duration/60/60):.4f}",
+            workload.count,
+            workload.discarded,
+            f"{(workload.discarded/workload.count*100):.2f}%",
+        ]
+        for workload in workloads
+    ]
 
-    # 保存到临时文件
-    with tempfile.TemporaryFile() as fp:
-        wb.save(fp)
-        fp.seek(0)
-        data = fp.read()
+    filename = datetime.now(tz=timezone(timedelta(hours=8))).strftime("%Y%m%d%H%M")
+    if export_format == schemas.operator.task.WorkloadExportFormat.CSV:
+        content = export.stream_csv(headers, rows)
+    else:
+        content = export.iter_file(
+            await run_in_threadpool(export.write_xlsx, headers, rows)
+        )
 
-    resp = Response(
-        content=data,
+    return StreamingResponse(
+        content=content,
         media_type="application/octet-stream",
         headers={
-            "Content-Disposition": f"attachment; filename={datetime.now(tz=timezone(timedelta(hours=8))).strftime('%Y%m%d%H%M')}.xlsx"
+            "Content-Disposition": f"attachment; filename={filename}.{export_format}"
         },
     )
 
-    return resp
-
 
 @router.post(
     "/data/preview/ids",
@@ -10,14 +10,15 @@ from openpyxl import Workbook
 
 from app import crud, schemas
 from app.core import exceptions
+from app.util import choice_stats, export
+from app.util.questionnaire_filter import (
+    filter_questionnaire,
+    load_questionnaire_columns,
+)
 from app.util.stats import (
-    ExportFilterLabelIDWithoutDupProjectModel,
-    ExportFilterLabelTaskProjectModel,
-    build_agg_choice_count,
     build_download_stats_id,
     build_filter_query,
     extract_choice_config,
-    filter_questionnaire,
 )
 
 router = APIRouter(prefix="/task/label")
@@ -42,45 +43,21 @@ async def stats_label_task(
         status=schemas.record.RecordStatus.COMPLETED,
     ).count()
 
+    # 选项计数在提交和打回时增量维护
+    counts = await choice_stats.get_counts(task, req.scope)
+
     records: list[schemas.operator.stats.StatsLabelTaskQuestion] = []
     for v in extract_choice_config(tool_config, req.scope):
-        choices = []
-        for option in v.get("options", []):
-            choices.append(
-                schemas.operator.stats.StatsLabelTaskChoice(
-                    label=option.get("label", "unknown"),
-                    value=option.get("value", "unknown"),
-                    count=0,
-                    total=total_count,
-                    id=option.get("id", "unknown"),
-                )
+        choices = [
+            schemas.operator.stats.StatsLabelTaskChoice(
+                label=option.get("label", "unknown"),
+                value=option.get("value", "unknown"),
+                count=counts.get((v.get("value", ""), option.get("value", "")), 0),
+                total=total_count,
+                id=option.get("id", "unknown"),
             )
-        question_kind = schemas.operator.stats.CHOICE_KIND.ENUM
-        if v["type"] == schemas.operator.stats.CHOICE_KIND.ARRAY:
-            question_kind = schemas.operator.stats.CHOICE_KIND.ARRAY
-
-        for res in (
-            await crud.data.query(
-                task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
-            )
-            .aggregate(
-                build_agg_choice_count(req.scope, question_kind, v["value"]),
-                projection_model=schemas.operator.stats.StatsLabelTaskProjectModel,
-            )
-            .to_list()
-        ):
-            if res.value is None:
-                continue
-            for idx, option in enumerate(v.get("options", [])):
-                if option.get("value", "") == res.value:
-                    choices[idx] = schemas.operator.stats.StatsLabelTaskChoice(
-                        label=option.get("label", "unknown"),
-                        value=res.value,
-                        count=res.count,
-                        total=total_count,
-                        id=option.get("id", "unknown"),
-                    )
-                    break
+            for option in v.get("options", [])
+        ]
         records.append(
             schemas.operator.stats.StatsLabelTaskQuestion(
                 label=v.get("label", "unknown"),
@@ -97,6 +74,21 @@ async def stats_label_task(
     )
 
 
+@router.post(
+    "/stats/rebuild",
+    summary="重新统计标注任务数据分布",
+    description="遍历已完成的数据重新统计选项计数",
+)
+async def rebuild_stats_label_task(
+    req: schemas.task.DoTaskBase = Body(...),
+) -> None:
+    task = await crud.label_task.query(task_id=req.task_id).first_or_none()
+    if not task:
+        raise exceptions.TASK_NOT_EXIST
+
+    await choice_stats.rebuild(task)
+
+
 @router.get(
     "/stats/export",
     summary="导出选项统计数据",
@@ -224,36 +216,28 @@ async def filter_label_task(
                     req.filters[i].type = schemas.operator.stats.CHOICE_KIND.ARRAY
 
     if req.kind == schemas.operator.stats.ANSWER_FLITER_KIND.WITHOUT_DUPLICATE:
-        res: list[ExportFilterLabelIDWithoutDupProjectModel] = (
+        res: list[schemas.operator.stats.ExportFilterLabelTaskIDProjectModel] = (
             await crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
             )
             .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelIDWithoutDupProjectModel,
+                build_filter_query(req.operator, req.filters),
+                projection_model=schemas.operator.stats.ExportFilterLabelTaskIDProjectModel,
             )
             .to_list()
         )
-        dedup_h = {}
-        for v in res:
-            dedup_h[str(v.data.data_id)] = 1
-        return schemas.operator.stats.RespFilterAnswer(count=len(dedup_h))
+        return schemas.operator.stats.RespFilterAnswer(count=len(res))
     else:
-        res2: list[ExportFilterLabelTaskProjectModel] = (
-            await crud.data.query(
+        columns = await load_questionnaire_columns(
+            crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
-            )
-            .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelTaskProjectModel,
-            )
-            .to_list()
+            ),
+            req.filters,
         )
 
-        dedup_h = {}
-        for r in filter_questionnaire(req.operator, req.filters, res2):
-            dedup_h[str(r.questionnaire_id)] = 1
-        return schemas.operator.stats.RespFilterAnswer(count=len(dedup_h))
+        return schemas.operator.stats.RespFilterAnswer(
+            count=len(filter_questionnaire(req.operator, req.filters, columns))
+        )
 
 
 @router.get(
@@ -283,48 +267,35 @@ async def export_label_id(params: str):
                     req.filters[i].type = schemas.operator.stats.CHOICE_KIND.ARRAY
 
     if req.kind == schemas.operator.stats.ANSWER_FLITER_KIND.WITHOUT_DUPLICATE:
-        res: list[ExportFilterLabelIDWithoutDupProjectModel] = (
+        res: list[schemas.operator.stats.ExportFilterLabelTaskIDProjectModel] = (
             await crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
             )
             .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelIDWithoutDupProjectModel,
+                build_filter_query(req.operator, req.filters),
+                projection_model=schemas.operator.stats.ExportFilterLabelTaskIDProjectModel,
             )
             .to_list()
         )
-        dedup_h = {}
         for v in res:
-            if str(v.data.data_id) in dedup_h:
-                continue
-            dedup_h[str(v.data.data_id)] = 1
-            custom_id = v.data.custom.get("id", "")
-            sheet.append([str(v.data.questionnaire_id), str(v.data.data_id), custom_id])
+            custom_id = ""
+            if len(v.custom_id) > 0:
+                custom_id = v.custom_id[0]
+            sheet.append([str(v.questionnaire_id), str(v.data_id), custom_id])
     else:
-        res2: list[ExportFilterLabelTaskProjectModel] = (
-            await crud.data.query(
+        columns = await load_questionnaire_columns(
+            crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
-            )
-            .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelTaskProjectModel,
-            )
-            .to_list()
+            ),
+            req.filters,
         )
         dedup_h = {}
-        for r in filter_questionnaire(req.operator, req.filters, res2):
-            for i in range(len(r.datas)):
-                if str(r.datas[i].data_id) in dedup_h:
+        for r in filter_questionnaire(req.operator, req.filters, columns):
+            for data_id, custom_id in zip(r.data_ids, r.custom_ids):
+                if str(data_id) in dedup_h:
                     continue
-                dedup_h[str(r.datas[i].data_id)] = 1
-                custom_id = r.datas[i].custom.get("id", "")
-                sheet.append(
-                    [
-                        str(r.questionnaire_id),
-                        str(r.datas[i].data_id),
-                        custom_id,
-                    ]
-                )
+                dedup_h[str(data_id)] = 1
+                sheet.append([str(r.questionnaire_id), str(data_id), custom_id])
 
     with tempfile.TemporaryFile() as fp:
         wb.save(fp)
@@ -363,72 +334,47 @@ async def export_label_data(params: str):
                     req.filters[i].type = schemas.operator.stats.CHOICE_KIND.ARRAY
 
     if req.kind == schemas.operator.stats.ANSWER_FLITER_KIND.WITHOUT_DUPLICATE:
-        res: list[ExportFilterLabelIDWithoutDupProjectModel] = (
+        res: list[schemas.operator.stats.ExportFilterLabelTaskIDProjectModel] = (
             await crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
             )
             .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelIDWithoutDupProjectModel,
+                build_filter_query(req.operator, req.filters),
+                projection_model=schemas.operator.stats.ExportFilterLabelTaskIDProjectModel,
             )
             .to_list()
         )
 
-        async def export_stream_data() -> AsyncGenerator:
-            datas = ""
-            index = 0
-            dedup_h: dict[str, int] = {}
-            for v in res:
-                if str(v.data.data_id) in dedup_h:
-                    continue
-                dedup_h[str(v.data.data_id)] = 1
-                index += 1
-                datas += (
-                    schemas.data.DoData.model_validate(
-                        v.data, from_attributes=True
-                    ).model_dump_json()
-                    + "\n"
-                )
-                if index % 100 == 0:
-                    yield datas
-                    datas = ""
-            if datas:
-                yield datas
-
+        data_ids = [v.data_id for v in res]
     else:
-        res2: list[ExportFilterLabelTaskProjectModel] = (
-            await crud.data.query(
+        columns = await load_questionnaire_columns(
+            crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
-            )
-            .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelTaskProjectModel,
-            )
-            .to_list()
+            ),
+            req.filters,
         )
 
-        async def export_stream_data() -> AsyncGenerator:
-            datas = ""
-            index = 0
-            dedup_h = {}
-            for r in filter_questionnaire(req.operator, req.filters, res2):
-                for i in range(len(r.datas)):
-                    if str(r.datas[i].data_id) in dedup_h:
-                        continue
-                    dedup_h[str(r.datas[i].data_id)] = 1
-                    index += 1
-                    datas += (
-                        schemas.data.DoData.model_validate(
-                            r.datas[i], from_attributes=True
-                        ).model_dump_json()
-                        + "\n"
-                    )
-
-                    if index % 100 == 0:
-                        yield datas
-                        datas = ""
-            if datas:
+        data_ids = [
+            data_id
+            for r in filter_questionnaire(req.operator, req.filters, columns)
+            for data_id in r.data_ids
+        ]
+
+    async def export_stream_data() -> AsyncGenerator:
+        datas = ""
+        # 筛选只返回 id，完整数据在导出时分批读取
+        async for v in crud.data.iter_by_data_ids(data_ids=data_ids):
+            datas += (
+                schemas.data.DoData.model_validate(
+                    v, from_attributes=True
+                ).model_dump_json()
+                + "\n"
+            )
+            if len(datas) >= export.EXPORT_FLUSH_SIZE:
                 yield datas
+                datas = ""
+        if datas:
+            yield datas
 
     resp = StreamingResponse(
         content=export_stream_data(),
@@ -469,56 +415,41 @@ async def list_label_id(
                     req.filters[i].type = schemas.operator.stats.CHOICE_KIND.ARRAY
 
     if req.kind == schemas.operator.stats.ANSWER_FLITER_KIND.WITHOUT_DUPLICATE:
-        res: list[ExportFilterLabelIDWithoutDupProjectModel] = (
+        res: list[schemas.operator.stats.ExportFilterLabelTaskIDProjectModel] = (
             await crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
             )
             .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelIDWithoutDupProjectModel,
+                build_filter_query(req.operator, req.filters),
+                projection_model=schemas.operator.stats.ExportFilterLabelTaskIDProjectModel,
             )
             .to_list()
         )
 
-        dedup_h = {}
-        data_ids: list[schemas.operator.stats.DoDataRecord] = []
-        for v in res:
-            if str(v.data.data_id) in dedup_h:
-                continue
-            dedup_h[str(v.data.data_id)] = 1
-            data_ids.append(
-                schemas.operator.stats.DoDataRecord(
-                    data_id=v.data.data_id, questionnaire_id=v.data.questionnaire_id
-                )
+        data_ids: list[schemas.operator.stats.DoDataRecord] = [
+            schemas.operator.stats.DoDataRecord(
+                data_id=v.data_id, questionnaire_id=v.questionnaire_id
             )
+            for v in res
+        ]
         return schemas.operator.stats.RespFilterAnswerDataID(
             _id=req.task_id, data=data_ids
         )
 
     else:
-        res2: list[ExportFilterLabelTaskProjectModel] = (
-            await crud.data.query(
+        columns = await load_questionnaire_columns(
+            crud.data.query(
                 task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
-            )
-            .aggregate(
-                build_filter_query(req.kind, req.operator, req.filters),
-                projection_model=ExportFilterLabelTaskProjectModel,
-            )
-            .to_list()
+            ),
+            req.filters,
         )
 
-        dedup_h: dict[str, int] = {}
-        questionnaire_ids: list[schemas.operator.stats.DoQuestionnaireRecord] = []
-        for r in filter_questionnaire(req.operator, req.filters, res2):
-            if str(r.questionnaire_id) in dedup_h:
-                continue
-            dedup_h[str(r.questionnaire_id)] = 1
-            questionnaire_ids.append(
-                schemas.operator.stats.DoQuestionnaireRecord(
-                    questionnaire_id=r.questionnaire_id,
-                    data_id=list(set([v.data_id for v in r.datas])),
-                )
+        questionnaire_ids: list[schemas.operator.stats.DoQuestionnaireRecord] = [
+            schemas.operator.stats.DoQuestionnaireRecord(
+                questionnaire_id=r.questionnaire_id, data_id=r.data_ids
             )
+            for r in filter_questionnaire(req.operator, req.filters, columns)
+        ]
 
         return schemas.operator.stats.RespFilterAnswerQuestionnaireID(
             _id=req.task_id, data=questionnaire_ids
@@ -5,6 +5,7 @@ from fastapi import APIRouter, Body, Depends
 from app import crud, models, schemas
 from app.api import deps
 from app.core import exceptions
+from app.util import team_cache
 
 router = APIRouter(prefix="/team", tags=["team"])
 
@@ -167,6 +168,7 @@ async def delete_team(
 
     # 删除团队
     await crud.team.remove(team.id)
+    await team_cache.invalidate_user_teams([t_user.user_id for t_user in team.users])
 
 
 @router.get(
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Body, Depends
 from app import crud, models, schemas
 from app.api import deps
 from app.core import exceptions
+from app.util import team_cache
 
 router = APIRouter(prefix="/user", tags=["user"])
 
@@ -98,4 +99,5 @@ async def join_team(
             name=None, owner=None, owner_cellphone=None, users=new_users, user_count=len(new_users),
         ),
     )
+    await team_cache.invalidate_user_teams([user.user_id])
 
@@ -5,6 +5,7 @@ from fastapi import APIRouter, Body, Depends
 from app import crud, models, schemas
 from app.api import deps
 from app.core import exceptions
+from app.util import team_cache
 
 router = APIRouter(prefix="/team/member", tags=["team_member"])
 
@@ -189,6 +190,7 @@ async def remove_member(
             name=None, owner=None, owner_cellphone=None, users=default_users, user_count=len(default_users),
         ),
     )
+    await team_cache.invalidate_user_teams([user_id])
 
 
 @router.post(
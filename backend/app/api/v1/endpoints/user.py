@@ -4,14 +4,19 @@ from datetime import timedelta
 
 from app.models.user import User
 from fastapi import APIRouter, Body, Depends, Response
+from pymongo.errors import BulkWriteError
 
 from app import crud, models, schemas
 from app.api import deps
 from app.core import exceptions, security
 from app.core.config import settings
+from app.util import team_cache, user_cache
 
 router = APIRouter(prefix="/user", tags=["user"])
 
+# MongoDB 唯一索引冲突的错误码
+DUPLICATE_KEY_ERROR = 11000
+
 
 @router.post("/create", summary="用户注册", response_model=schemas.user.UserInfo)
 async def create_user(req: schemas.user.UserLoginRequest, response: Response):
@@ -27,7 +32,7 @@ async def create_user(req: schemas.user.UserLoginRequest, response: Response):
         user_role = schemas.user.UserType.USER
         team_role = schemas.team.TeamMemberRole.USER
 
-    user = await crud.user.query(name=req.username).first_or_none()
+    user = await crud.user.query(exact_name=req.username).first_or_none()
     team = await crud.team.query(team_id=schemas.team.DEFAULT_TEAM_ID).first_or_none()
 
     if user:
@@ -35,7 +40,7 @@ async def create_user(req: schemas.user.UserLoginRequest, response: Response):
     if not team:
         raise exceptions.TEAM_NOT_EXIST
 
-    hashed_password = security.get_password_hash(req.password)
+    hashed_password = await security.get_password_hash_async(req.password)
 
     user = await crud.user.create(
         obj_in=models.user.UserCreate(
@@ -57,6 +62,7 @@ async def create_user(req: schemas.user.UserLoginRequest, response: Response):
             user_count=len(default_team_users),
         ),
     )
+    await team_cache.invalidate_user_teams([user.user_id])
 
     access_token = security.create_access_token(
         subject=user.name,
@@ -73,6 +79,91 @@ async def create_user(req: schemas.user.UserLoginRequest, response: Response):
     )
 
 
+@router.post(
+    "/batch_create",
+    summary="批量创建用户",
+    description="批量创建用户，已存在的用户名会被跳过",
+    response_model=schemas.user.RespBatchCreateUser,
+)
+async def batch_create_user(
+    req: schemas.user.ReqBatchCreateUser = Body(...),
+    user: schemas.user.DoUser = Depends(deps.get_current_user),
+) -> schemas.user.RespBatchCreateUser:
+    if user.role not in (
+        schemas.user.UserType.SUPER_ADMIN,
+        schemas.user.UserType.ADMIN,
+    ):
+        raise exceptions.USER_PERMISSION_DENIED
+
+    # 与注册一样加入默认团队，指定团队时同时加入指定团队
+    team_ids = [schemas.team.DEFAULT_TEAM_ID]
+    if req.team_id and req.team_id != schemas.team.DEFAULT_TEAM_ID:
+        team_ids.append(req.team_id)
+    if await crud.team.query(team_id=team_ids).count() != len(team_ids):
+        raise exceptions.TEAM_NOT_EXIST
+
+    # 同名用户只创建一次，跳过已存在的用户名
+    req_users = {item.username: item for item in req.users}
+    existed_users = await crud.user.query(exact_name=list(req_users)).to_list()
+    duplicated = {existed_user.name for existed_user in existed_users}
+    new_users = [item for name, item in req_users.items() if name not in duplicated]
+    if not new_users:
+        return schemas.user.RespBatchCreateUser(list=[], duplicated=list(duplicated))
+
+    hashed_passwords = await security.get_password_hashes(
+        [item.password for item in new_users]
+    )
+    users_in = [
+        models.user.UserCreate(
+            user_id=str(uuid4()),
+            name=item.username,
+            password=hashed_password,
+        )
+        for item, hashed_password in zip(new_users, hashed_passwords)
+    ]
+    try:
+        users = await crud.user.create_many(obj_in=users_in, ordered=False)
+    except BulkWriteError as e:
+        # 并发创建了同名用户，唯一索引冲突的用户计入重复，其余用户已正常写入
+        write_errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY_ERROR for err in write_errors):
+            raise
+        failed = {err["index"] for err in write_errors}
+        duplicated |= {users_in[i].name for i in failed}
+        users = await crud.user.query(
+            user_id=[v.user_id for i, v in enumerate(users_in) if i not in failed]
+        ).to_list()
+        if not users:
+            return schemas.user.RespBatchCreateUser(
+                list=[], duplicated=list(duplicated)
+            )
+
+    await crud.team.add_members(
+        team_id=team_ids,
+        members=[
+            schemas.team.TeamMember(
+                user_id=new_user.user_id,
+                name=new_user.name,
+                role=schemas.team.TeamMemberRole.USER,
+            )
+            for new_user in users
+        ],
+    )
+    await team_cache.invalidate_user_teams([new_user.user_id for new_user in users])
+
+    return schemas.user.RespBatchCreateUser(
+        list=[
+            schemas.user.UserInfo(
+                user_id=new_user.user_id,
+                role=new_user.role,
+                name=new_user.name,
+            )
+            for new_user in users
+        ],
+        duplicated=list(duplicated),
+    )
+
+
 @router.post(
     "/login",
     summary="用户登录",
@@ -82,12 +173,12 @@ async def login(
     req: schemas.user.UserLoginRequest,
     response: Response,
 ):
-    user = await crud.user.query(name=req.username).first_or_none()
+    user = await crud.user.query(exact_name=req.username).first_or_none()
 
     if not user:
         raise exceptions.USER_NOT_EXIST
 
-    if not security.verify_password(req.password, user.password):
+    if not await security.verify_password_async(req.password, user.password):
         raise exceptions.TOKEN_INVALID
 
     access_token = security.create_access_token(
@@ -119,7 +210,8 @@ async def logout(response: Response):
     response_model=schemas.user.RespMe,
 )
 async def get_me(user: User = Depends(deps.get_current_user)):
-    teams = await crud.team.query(user_id=user.user_id).to_list()
+    team_ids = await team_cache.get_user_team_ids(user.user_id)
+    teams = await crud.team.query(team_id=list(team_ids)).to_list()
     team_roles = []
     for team in teams:
         for u in team.users:
@@ -150,7 +242,7 @@ async def edit_user(
     
 
 
-    db_user = await crud.user.query(user_id=user_info.user_id, name=user_info.name).first_or_none()
+    db_user = await crud.user.query(user_id=user_info.user_id, exact_name=user_info.name).first_or_none()
     if not db_user:
         raise exceptions.USER_NOT_EXIST
 
@@ -172,6 +264,7 @@ async def edit_user(
             role=user_info.role,
         ),
     )
+    await user_cache.invalidate_user(db_user.name)
 
 
 @router.post(
@@ -232,7 +325,8 @@ async def list_users(
 async def list_user_teams(
     user: User = Depends(deps.get_current_user),
 ):
-    teams = await crud.team.query(user_id=user.user_id).to_list()
+    team_ids = await team_cache.get_user_team_ids(user.user_id)
+    teams = await crud.team.query(team_id=list(team_ids)).to_list()
 
     return schemas.user.ListUserTeamInfoResp(
         list=[
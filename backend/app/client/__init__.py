@@ -1 +1 @@
-from . import minio
+from . import http, minio
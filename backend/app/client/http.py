@@ -0,0 +1,11 @@
+import httpx
+
+# 共享的 HTTP 客户端，复用连接池
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=httpx.Timeout(10.0, read=300.0),
+)
+
+
+async def close_http_client() -> None:
+    await http_client.aclose()
@@ -1,16 +1,219 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import cached_property, partial
+from typing import IO, AsyncGenerator, AsyncIterable, AsyncIterator
+from urllib.parse import urlsplit
+
+import certifi
+import urllib3
 from minio import Minio
 
 from app.core.config import settings
 
+# 分片上传的分片大小
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
+# 流式读取的块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class AsyncIterableReader(io.RawIOBase):
+    """
+    在线程中以文件方式读取异步生成的数据，用于把异步数据流交给同步的上传接口
+    """
+
+    def __init__(
+        self, chunks: AsyncIterable[bytes], loop: asyncio.AbstractEventLoop
+    ) -> None:
+        super().__init__()
+        self._chunks: AsyncIterator[bytes] = aiter(chunks)
+        self._loop = loop
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    async def _anext(self) -> bytes:
+        return await anext(self._chunks)
+
+    def _next_chunk(self) -> bytes:
+        try:
+            return asyncio.run_coroutine_threadsafe(self._anext(), self._loop).result()
+        except StopAsyncIteration:
+            self._eof = True
+            return b""
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        尽量读满 size 字节，避免上传时逐块拼接
+        """
+        chunks = [self._buffer] if self._buffer else []
+        length = len(self._buffer)
+        while (size < 0 or length < size) and not self._eof:
+            chunk = self._next_chunk()
+            chunks.append(chunk)
+            length += len(chunk)
+        data = b"".join(chunks)
+        if size < 0:
+            self._buffer = b""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
 
 class MinioClient:
+    """
+    MinIO 异步封装，阻塞调用在独立线程池中执行，所有请求共享一个连接池
+    """
+
     def __init__(
         self, ak: str, sk: str, endpoint: str, internal_endpoint: str, bucket: str
     ):
-        self.client = Minio(internal_endpoint, access_key=ak, secret_key=sk, secure=False)
+        self.http_client = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=settings.MINIO_POOL_SIZE,
+            block=True,
+            timeout=urllib3.Timeout(connect=5, read=300),
+            retries=urllib3.Retry(
+                total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+            ),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=certifi.where(),
+        )
+        self.client = Minio(
+            internal_endpoint,
+            access_key=ak,
+            secret_key=sk,
+            secure=False,
+            http_client=self.http_client,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.MINIO_POOL_SIZE, thread_name_prefix="minio"
+        )
         self.bucket = bucket
         self.endpoint = endpoint
         self.internal_endpoint = internal_endpoint
+        self.ak = ak
+        self.sk = sk
+
+    @cached_property
+    def public_client(self) -> Minio:
+        """
+        用于生成外部可访问的预签名地址，指定 region 避免签名时请求外部地址
+        """
+        url = urlsplit(self.endpoint if "://" in self.endpoint else f"//{self.endpoint}")
+        return Minio(
+            url.netloc,
+            access_key=self.ak,
+            secret_key=self.sk,
+            secure=url.scheme == "https",
+            region=settings.MINIO_REGION,
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(func, *args, **kwargs)
+        )
+
+    async def put_object(
+        self,
+        path: str,
+        data: IO[bytes],
+        length: int = -1,
+        content_type: str = "application/octet-stream",
+        metadata: dict | None = None,
+    ):
+        """
+        上传对象，长度未知或超过分片大小时使用分片上传
+        """
+        return await self._run(
+            self.client.put_object,
+            self.bucket,
+            path,
+            data,
+            length=length,
+            content_type=content_type,
+            metadata=metadata,
+            part_size=MULTIPART_PART_SIZE,
+        )
+
+    async def put_stream(
+        self,
+        path: str,
+        chunks: AsyncIterable[bytes],
+        content_type: str = "application/octet-stream",
+    ):
+        """
+        边生成边分片上传，内存占用只与分片大小有关
+        """
+        return await self.put_object(
+            path,
+            AsyncIterableReader(chunks, asyncio.get_running_loop()),
+            content_type=content_type,
+        )
+
+    async def get_object(self, path: str) -> bytes:
+        def _get() -> bytes:
+            response = self.client.get_object(self.bucket, path)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+        return await self._run(_get)
+
+    async def stream_object(
+        self,
+        path: str,
+        offset: int = 0,
+        length: int = 0,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        流式读取对象，offset/length 用于读取部分内容
+        """
+        response = await self._run(
+            self.client.get_object, self.bucket, path, offset=offset, length=length
+        )
+        try:
+            while True:
+                chunk = await self._run(response.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def stat_object(self, path: str):
+        return await self._run(self.client.stat_object, self.bucket, path)
+
+    async def remove_object(self, path: str) -> None:
+        await self._run(self.client.remove_object, self.bucket, path)
+
+    async def presigned_get_object(
+        self, path: str, expires: timedelta = timedelta(days=1)
+    ) -> str:
+        return await self._run(
+            self.client.presigned_get_object, self.bucket, path, expires=expires
+        )
+
+    def public_presigned_get_object(
+        self,
+        path: str,
+        expires: timedelta = timedelta(days=1),
+        response_headers: dict | None = None,
+    ) -> str:
+        """
+        生成外部可访问的预签名地址，只做本地签名计算
+        """
+        return self.public_client.presigned_get_object(
+            self.bucket, path, expires=expires, response_headers=response_headers
+        )
+
 
 minio = MinioClient(
     settings.MINIO_ACCESS_KEY_ID,
@@ -19,4 +222,3 @@ minio = MinioClient(
     settings.MINIO_INTERNAL_ENDPOINT,
     settings.MINIO_BUCKET,
 )
-
@@ -19,6 +19,12 @@ class Settings(BaseSettings):
     # Redis Config
     REDIS_DSN: RedisDsn = RedisDsn("redis://localhost:16279/0")  # type: ignore
 
+    # Scheduler Config
+    # 开放任务回收任务的分片数，所有进程需保持一致
+    SCHEDULER_SHARD_COUNT: int = 1
+    # 本 worker 进程负责的分片，每个进程设置不同的值；不设置时处理所有分片
+    SCHEDULER_SHARD: int | None = None
+
     # Sentry Config
     SENTRY_DSN: str = ""
 
@@ -28,6 +34,14 @@ class Settings(BaseSettings):
     MINIO_ENDPOINT: str = ""
     MINIO_INTERNAL_ENDPOINT: str = ""
     MINIO_BUCKET: str = ""
+    MINIO_REGION: str = "us-east-1"
+    # 文件预览默认重定向到预签名地址
+    FILE_PREVIEW_REDIRECT: bool = False
+    # MinIO 连接池大小
+    MINIO_POOL_SIZE: int = 16
+
+    # 密码哈希线程数
+    PASSWORD_HASH_WORKERS: int = 4
 
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
@@ -62,6 +62,10 @@ TASK_HAS_AUDIT_TASK = AppEx(TASK + 4, "Task has audit task")
 TASK_IS_DONE = AppEx(TASK + 5, "Task is done")
 # 有后续任务，不允许删除当前任务
 TASK_HAS_NEXT_TASK = AppEx(TASK + 6, "Task has next task")
+# 导出格式不可用
+EXPORT_FORMAT_NOT_SUPPORTED = AppEx(TASK + 7, "Export format not supported")
+# 导出任务不存在
+EXPORT_JOB_NOT_EXIST = AppEx(TASK + 8, "Export job not exist")
 
 # 数据
 DATA_NOT_EXIST = AppEx(DATA + 1, "Data not exist")  # 数据不存在
@@ -73,6 +77,7 @@ RECORD_NOT_EXIST = AppEx(RECORD + 1, "Record not exist")  # 数据记录不存
 
 # 文件上传
 FILE_UPLOAD_LIMIT = AppEx(FILE + 1, "Upload limit")  # 上传限制
+FILE_NOT_EXIST = AppEx(FILE + 2, "File not exist", status_code=404)  # 文件不存在
 
 # 流程
 FLOW_NOT_EXIST = AppEx(FLOW + 1, "Flow not exist")  # 流程不存在
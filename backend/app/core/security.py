@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
@@ -9,6 +11,11 @@ from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt 计算时会释放 GIL，放到线程池中执行，避免阻塞事件循环
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password"
+)
+
 
 ALGORITHM = "HS256"
 
@@ -28,6 +35,27 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, get_password_hash, password
+    )
+
+
+async def get_password_hashes(passwords: list[str]) -> list[str]:
+    """
+    并行计算多个密码的哈希
+    """
+    return await asyncio.gather(
+        *[get_password_hash_async(password) for password in passwords]
+    )
+
+
 def verify_access_token(token: str):
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
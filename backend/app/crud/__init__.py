@@ -2,6 +2,7 @@ from .crud_data import data
 from .crud_file import file
 from .crud_label_task import label_task
 from .crud_record import record
+from .crud_task_progress import task_progress
 from .crud_team import team
 from .crud_team_invitation import team_invitation_link
 from .crud_user import user
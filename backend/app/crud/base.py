@@ -62,9 +62,14 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         *,
         obj_in: list[CreateSchemaType],
         session: ClientSession | None = None,
+        ordered: bool = True,
     ) -> list[ModelType]:
         db_obj = [self.model.model_validate(obj, from_attributes=True) for obj in obj_in]
-        await self.model.insert_many(db_obj, session=session)
+        result = await self.model.insert_many(
+            db_obj, session=session, ordered=ordered
+        )
+        for obj, inserted_id in zip(db_obj, result.inserted_ids):
+            obj.id = inserted_id
         return db_obj
 
     async def update(
@@ -1,12 +1,17 @@
-from typing import Any
-from uuid import UUID
+import time
+from typing import Any, AsyncGenerator
+from uuid import UUID, uuid4
 
-from beanie.operators import In, NotIn
+from beanie import UpdateResponse
+from beanie.operators import In, NotIn, Set
 
 from app import schemas
 from app.crud.base import CRUDBase
 from app.models.data import Data, DataCreate, DataUpdate
 
+# 批量领取时写入的临时标识字段，不属于 Data 模型
+CLAIM_ID_FIELD = "claim_id"
+
 
 class CRUDData(CRUDBase[Data, DataCreate, DataUpdate]):
     def query(
@@ -95,5 +100,80 @@ class CRUDData(CRUDBase[Data, DataCreate, DataUpdate]):
 
         return query
 
+    async def claim(
+        self,
+        *,
+        data_id: UUID,
+        from_status: schemas.data.DataStatus,
+        to_status: schemas.data.DataStatus,
+    ) -> Data | None:
+        """
+        原子地将数据从 from_status 转为 to_status，返回转换后的数据
+
+        数据状态不是 from_status 时（例如已被他人领取）返回 None
+        """
+        return await self.model.find_one(
+            self.model.data_id == data_id,
+            self.model.status == from_status,
+        ).update(
+            Set(
+                {
+                    self.model.status: to_status,
+                    self.model.update_time: int(time.time()),
+                }
+            ),
+            response_type=UpdateResponse.NEW_DOCUMENT,
+        )
+
+    async def claim_many(
+        self,
+        *,
+        data_ids: list[UUID],
+        from_status: schemas.data.DataStatus,
+        to_status: schemas.data.DataStatus,
+    ) -> list[Data]:
+        """
+        批量将数据从 from_status 转为 to_status，返回本次转换成功的数据
+
+        使用一次 update_many 转换状态，并写入临时的领取标识，用于区分被他人并发领取的数据，
+        读取后删除标识
+        """
+        if not data_ids:
+            return []
+
+        claim_id = uuid4()
+        await self.query(data_id=data_ids, status=from_status).update(
+            Set(
+                {
+                    self.model.status: to_status,
+                    self.model.update_time: int(time.time()),
+                    CLAIM_ID_FIELD: claim_id,
+                }
+            )
+        )
+
+        claimed_query = self.query(data_id=data_ids).find({CLAIM_ID_FIELD: claim_id})
+        datas = await claimed_query.to_list()
+        await claimed_query.update({"$unset": {CLAIM_ID_FIELD: ""}})
+        return datas
+
+    async def iter_by_data_ids(
+        self,
+        *,
+        data_ids: list[UUID],
+        batch_size: int = 500,
+    ) -> AsyncGenerator[Data, None]:
+        """
+        按 data_ids 的顺序分批读取数据，内存中只保留一批
+        """
+        for i in range(0, len(data_ids), batch_size):
+            batch = data_ids[i : i + batch_size]
+            datas = {
+                v.data_id: v for v in await self.query(data_id=batch).to_list()
+            }
+            for data_id in batch:
+                if data_id in datas:
+                    yield datas[data_id]
+
 
 data = CRUDData(Data)
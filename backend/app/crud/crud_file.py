@@ -1,9 +1,25 @@
+from typing import Any
+
 from app.crud.base import CRUDBase
 from app.models.file import File, FileCreate, FileUpdate
 
 
 class CRUDFile(CRUDBase[File, FileCreate, FileUpdate]):
-    ...
+    def query(
+        self,
+        *,
+        _id: list[Any] | Any = None,
+        skip: int | None = None,
+        limit: int | None = None,
+        sort: str | list[str] | None = None,
+        sha256: str | None = None,
+    ):
+        query = super().query(_id=_id, sort=sort, skip=skip, limit=limit)
+
+        if sha256 is not None:
+            query = query.find(self.model.sha256 == sha256)
+
+        return query
 
 
 file = CRUDFile(File)
@@ -22,6 +22,8 @@ class CRUDRecord(CRUDBase[Record, RecordCreate, RecordUpdate]):
         user_id: str | list[str] | None = None,
         create_time_gt: int | None = None,
         create_time_lt: int | None = None,
+        submit_time_gte: int | None = None,
+        submit_time_lt: int | None = None,
         is_submit: bool | None = None,
         status: RecordStatus | list[RecordStatus] | None = None,
     ):
@@ -57,6 +59,12 @@ class CRUDRecord(CRUDBase[Record, RecordCreate, RecordUpdate]):
         if create_time_lt is not None:
             query = query.find(self.model.create_time < create_time_lt)
 
+        if submit_time_gte is not None:
+            query = query.find(self.model.submit_time >= submit_time_gte)
+
+        if submit_time_lt is not None:
+            query = query.find(self.model.submit_time < submit_time_lt)
+
         if is_submit is not None:
             if is_submit:
                 query = query.find(self.model.submit_time != None)
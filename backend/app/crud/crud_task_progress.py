@@ -0,0 +1,70 @@
+import time
+from typing import Any
+from uuid import UUID
+
+from beanie.operators import In, Inc, Set
+
+from app.crud.base import CRUDBase
+from app.models.task_progress import (
+    TaskProgress,
+    TaskProgressCreate,
+    TaskProgressUpdate,
+)
+
+
+class CRUDTaskProgress(CRUDBase[TaskProgress, TaskProgressCreate, TaskProgressUpdate]):
+    def query(
+        self,
+        *,
+        _id: list[Any] | Any = None,
+        skip: int | None = None,
+        limit: int | None = None,
+        sort: str | list[str] | None = None,
+        task_id: UUID | list[UUID] | None = None,
+    ):
+        query = super().query(_id=_id, skip=skip, limit=limit, sort=sort)
+
+        if task_id is not None:
+            if isinstance(task_id, list):
+                query = query.find(In(self.model.task_id, task_id))
+            else:
+                query = query.find(self.model.task_id == task_id)
+
+        return query
+
+    async def inc(self, *, task_id: UUID, counts: dict[str, int]) -> None:
+        """
+        增量更新任务进度计数，计数不存在时不处理（读取时会重新统计）
+        """
+        counts = {field: count for field, count in counts.items() if count}
+        if not counts:
+            return
+
+        await self.query(task_id=task_id).update(
+            Inc({**counts, self.model.version: 1}),
+            Set({self.model.update_time: int(time.time())}),
+        )
+
+    async def touch(self, *, task_id: UUID) -> None:
+        """
+        只更新版本号，用于计数不变但数据内容变化的情况
+        """
+        await self.query(task_id=task_id).update(
+            Inc({self.model.version: 1}),
+            Set({self.model.update_time: int(time.time())}),
+        )
+
+    async def upsert(self, *, obj_in: TaskProgressCreate) -> None:
+        """
+        写入重新统计的计数，计数没有变化时不更新，避免导出结果失效
+        """
+        counts = obj_in.model_dump(exclude={"update_time"})
+        if await self.model.find_one(counts):
+            return
+
+        await self.query(task_id=obj_in.task_id).update(
+            Set(obj_in.model_dump()), Inc({self.model.version: 1}), upsert=True
+        )
+
+
+task_progress = CRUDTaskProgress(TaskProgress)
@@ -1,10 +1,12 @@
+import time
 from typing import Any
 from uuid import UUID
 
-from beanie.operators import Eq, In, RegEx
+from beanie.operators import Eq, In, Inc, Push, RegEx, Set
 
 from app.crud.base import CRUDBase
 from app.models.team import Team, TeamCreate, TeamUpdate
+from app.schemas.team import TeamMember
 
 
 class CRUDTeam(CRUDBase[Team, TeamCreate, TeamUpdate]):
@@ -37,6 +39,21 @@ class CRUDTeam(CRUDBase[Team, TeamCreate, TeamUpdate]):
 
         return query
 
+    async def add_members(
+        self, *, team_id: list[UUID] | UUID, members: list[TeamMember]
+    ) -> None:
+        """
+        原子地追加团队成员，不覆盖并发修改的成员列表
+        """
+        if not members:
+            return
+
+        await self.query(team_id=team_id).update(
+            Push({self.model.users: {"$each": [v.model_dump() for v in members]}}),
+            Inc({self.model.user_count: len(members)}),
+            Set({self.model.update_time: int(time.time())}),
+        )
+
 
 team = CRUDTeam(Team)
 
@@ -17,6 +17,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         sort: str | list[str] | None = None,
         user_id: list[str] | str | None = None,
         name: str | None = None,
+        exact_name: list[str] | str | None = None,
         role: list[UserType] | UserType | None = None,
         password: list[str] | str | None = None
     ):
@@ -43,6 +44,12 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         if name:
             query = query.find(RegEx(field=self.model.name, pattern=name))  # type: ignore
 
+        if exact_name is not None:
+            if isinstance(exact_name, list):
+                query = query.find(In(self.model.name, exact_name))
+            else:
+                query = query.find(self.model.name == exact_name)
+
         return query
 
 
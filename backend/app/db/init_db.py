@@ -7,6 +7,7 @@ from app.models.data import Data
 from app.models.file import File
 from app.models.label_task import LabelTask
 from app.models.record import Record
+from app.models.task_progress import TaskProgress
 from app.models.team import Team, TeamCreate
 from app.models.team_invitation import TeamInvitationLink
 from app.models.user import User
@@ -16,7 +17,7 @@ from app.schemas.team import TeamMember, TeamMemberRole
 async def init_db():
     await init_beanie(
         database=mongo_session[settings.MongoDB_DB_NAME],
-        document_models=[User, LabelTask, Data, Team, TeamInvitationLink, Record, File],  # type: ignore
+        document_models=[User, LabelTask, Data, Team, TeamInvitationLink, Record, File, TaskProgress],  # type: ignore
     )
 
     # 创建默认团队
@@ -4,10 +4,13 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from app.api.router import router
+from app.client.http import close_http_client
 from app.core.config import settings
 from app.db.init_db import close_db, init_db
 from app.logger.logger import init_logger
 from app.scheduler.init_scheduler import scheduler
+from app.scheduler.task import add_scheduler_jobs
+from app.util.user_cache import listen_user_invalidation
 
 
 @asynccontextmanager
@@ -19,11 +22,17 @@ async def lifespan(app: FastAPI):
         await init_db()
         # 初始化定时任务
         scheduler.start()
+        add_scheduler_jobs()
+        # 订阅用户缓存失效通知
+        user_invalidation_listener = asyncio.create_task(listen_user_invalidation())
     except Exception as e:
         raise e
     yield
+    user_invalidation_listener.cancel()
     # 关闭定时任务
     scheduler.shutdown()
+    # 关闭 HTTP 客户端
+    await close_http_client()
     # 关闭数据库
     await close_db()
 
@@ -1 +1 @@
-from . import data, file, label_task, record, team, team_invitation, user
+from . import data, file, label_task, record, task_progress, team, team_invitation, user
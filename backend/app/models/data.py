@@ -4,6 +4,7 @@ from uuid import UUID, uuid4
 
 from beanie import Document, Indexed
 from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
 
 from app import schemas
 
@@ -42,6 +43,11 @@ class Data(Document):
     # 评价
     evaluation: schemas.evaluation.Evaluation
 
+    # 展开后的评价，用于统计和筛选
+    evaluation_index: list[schemas.evaluation.EvaluationIndex] = Field(
+        default_factory=list
+    )
+
     # 更新时间
     update_time: int
 
@@ -53,7 +59,18 @@ class Data(Document):
 
     class Settings:
         use_revision = True
-    
+        indexes = [
+            # 按问题和答案统计、筛选
+            IndexModel(
+                [
+                    ("task_id", ASCENDING),
+                    ("evaluation_index.scope", ASCENDING),
+                    ("evaluation_index.question", ASCENDING),
+                    ("evaluation_index.answer", ASCENDING),
+                ]
+            ),
+        ]
+
 
 class DataCreate(BaseModel):
     data_id: UUID = Field(default_factory=uuid4)
@@ -76,4 +93,5 @@ class DataCreate(BaseModel):
 class DataUpdate(BaseModel):
     status: schemas.data.DataStatus | None = None
     evaluation: schemas.evaluation.Evaluation | None = None
+    evaluation_index: list[schemas.evaluation.EvaluationIndex] | None = None
     update_time: int = Field(default_factory=lambda: int(time.time()))
@@ -1,7 +1,8 @@
 import time
+from typing import Annotated
 from uuid import UUID, uuid4
 
-from beanie import Document
+from beanie import Document, Indexed
 from pydantic import BaseModel, Field
 
 
@@ -10,11 +11,24 @@ class File(Document):
     creator_id: str
     create_time: int
 
+    # 文件内容 sha256
+    sha256: Annotated[str | None, Indexed()] = Field(default=None)
+    # 文件大小
+    size: int | None = Field(default=None)
+    # 文件类型
+    content_type: str | None = Field(default=None)
+    # 对象存储路径
+    path: str | None = Field(default=None)
+
 
 class FileCreate(BaseModel):
     file_id: UUID = Field(default_factory=uuid4)
     creator_id: str
     create_time: int = Field(default_factory=lambda: int(time.time()))
+    sha256: str | None = None
+    size: int | None = None
+    content_type: str | None = None
+    path: str | None = None
 
 
 class FileUpdate(BaseModel):
@@ -4,6 +4,7 @@ from uuid import UUID
 
 from beanie import Document, Indexed
 from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
 
 from app import schemas
 
@@ -39,6 +40,10 @@ class Record(Document):
 
     class Settings:
         use_revision = True
+        indexes = [
+            # 按提交时间统计工作量
+            IndexModel([("task_id", ASCENDING), ("submit_time", ASCENDING)]),
+        ]
 
 
 class RecordCreate(BaseModel):
@@ -0,0 +1,46 @@
+import time
+from typing import Annotated
+from uuid import UUID
+
+from beanie import Document, Indexed
+from pydantic import BaseModel, Field
+
+
+class TaskProgress(Document):
+    """
+    标注任务进度计数
+    """
+
+    # 任务id
+    task_id: Annotated[UUID, Indexed(unique=True)]
+
+    # 总题数（不含打回后重新创建的数据）
+    total: int = 0
+    # 待标注题数
+    pending: int = 0
+    # 标注中题数
+    labeling: int = 0
+    # 已完成题数
+    completed: int = 0
+    # 已废弃题数
+    discarded: int = 0
+
+    # 数据版本，计数或数据内容变化时加一，用于判断导出结果是否可以复用
+    version: int = 0
+
+    # 更新时间
+    update_time: int = Field(default_factory=lambda: int(time.time()))
+
+
+class TaskProgressCreate(BaseModel):
+    task_id: UUID
+    total: int = 0
+    pending: int = 0
+    labeling: int = 0
+    completed: int = 0
+    discarded: int = 0
+    update_time: int = Field(default_factory=lambda: int(time.time()))
+
+
+class TaskProgressUpdate(BaseModel):
+    pass
@@ -31,6 +31,9 @@ class Team(Document):
     # 成员个数
     user_count: int
 
+    class Settings:
+        indexes = ["users.user_id"]
+
 
 class TeamCreate(BaseModel):
     team_id: UUID = Field(default_factory=uuid4)
@@ -18,7 +18,7 @@ class User(Document):
     role: schemas.user.UserType
 
     # 用户名称
-    name: str
+    name: Annotated[str, Indexed(unique=True)]
 
     # 创建时间
     create_time: int = 0
@@ -1,4 +1,5 @@
 from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.redis import RedisJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
@@ -10,7 +11,9 @@ jobstores = {
         port=settings.REDIS_DSN.port,
         db=int(settings.REDIS_DSN.path[1:] if settings.REDIS_DSN.path else 0),
         password=settings.REDIS_DSN.password,
-    )
+    ),
+    # 只在当前进程执行的任务（如分片回收任务），不在进程间共享
+    "local": MemoryJobStore(),
 }
 
 executors = {"default": AsyncIOExecutor()}
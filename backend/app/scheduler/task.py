@@ -1,53 +1,289 @@
 import time
+import zlib
+from collections import defaultdict
 from uuid import UUID
 
 from loguru import logger
 from redis.exceptions import LockError
 
 from app import crud, models, schemas
+from app.core.config import settings
 from app.db.session import redis_session
 from app.scheduler import scheduler
-from app.util import sample
+from app.util import dispatch, lease, progress, sample
+
+# 租约回收任务id
+LEASE_SWEEPER_JOB_ID = "lease_sweeper_job"
+# 租约回收间隔（秒）
+LEASE_SWEEP_INTERVAL = 10
+# 单次弹出的租约数量
+LEASE_SWEEP_BATCH = 1000
+# 单批回收的记录数量
+RECLAIM_BATCH_SIZE = 1000
+# 开放任务过期数据回收间隔（秒）
+TASK_SWEEP_INTERVAL = 30
+# 任务进度计数修复任务id
+PROGRESS_REPAIR_JOB_ID = "progress_repair_job"
+# 任务进度计数修复间隔（秒）
+PROGRESS_REPAIR_INTERVAL = 10 * 60
+# 单次重新统计的任务数量
+PROGRESS_REPAIR_BATCH = 100
+
 
 def task_scheduler_job_name(task_id: UUID):
     return f"task_scheduler_job_{task_id}"
 
 
-# 标注任务定时数据处理
+# 标注任务定时数据处理（已由 task_sweeper_job 统一处理，保留用于清理历史任务）
 async def label_task_scheduler_job(task_id: UUID):
+    logger.info(f"Remove legacy scheduler job for label task {task_id}")
+    if scheduler.get_job(task_scheduler_job_name(task_id)):
+        scheduler.remove_job(job_id=task_scheduler_job_name(task_id))
+
+
+def task_sweeper_job_name(shard: int | str) -> str:
+    return f"task_sweeper_job_{shard}"
+
+
+def task_shard(task_id: UUID) -> int:
+    return zlib.crc32(task_id.bytes) % settings.SCHEDULER_SHARD_COUNT
+
+
+def worker_shards() -> list[int]:
+    """
+    当前进程负责的分片，未指定时负责所有分片
+    """
+    if settings.SCHEDULER_SHARD is None:
+        return list(range(settings.SCHEDULER_SHARD_COUNT))
+    if not 0 <= settings.SCHEDULER_SHARD < settings.SCHEDULER_SHARD_COUNT:
+        raise ValueError(
+            f"SCHEDULER_SHARD must be in [0, {settings.SCHEDULER_SHARD_COUNT})"
+        )
+    return [settings.SCHEDULER_SHARD]
+
+
+def add_scheduler_jobs():
+    scheduler.add_job(
+        lease_sweeper_job,
+        "interval",
+        seconds=LEASE_SWEEP_INTERVAL,
+        id=LEASE_SWEEPER_JOB_ID,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        progress_repair_job,
+        "interval",
+        seconds=PROGRESS_REPAIR_INTERVAL,
+        id=PROGRESS_REPAIR_JOB_ID,
+        replace_existing=True,
+    )
+
+    # 清理共享任务存储中的分片任务，分片任务只在负责该分片的进程中执行
+    for job in scheduler.get_jobs(jobstore="default"):
+        if job.id.startswith(task_sweeper_job_name("")):
+            job.remove()
+
+    for shard in worker_shards():
+        scheduler.add_job(
+            task_sweeper_job,
+            "interval",
+            args=[shard],
+            seconds=TASK_SWEEP_INTERVAL,
+            id=task_sweeper_job_name(shard),
+            jobstore="local",
+            replace_existing=True,
+        )
+
+
+async def _reclaim_batch(records: list[schemas.record.ViewRecordData]) -> int:
+    """
+    删除一批未提交的记录，并将对应加工中的数据重置为待加工
+    """
+    if not records:
+        return 0
+
+    # 只删除仍未提交的记录，只重置仍在加工中的数据，避免与提交并发时误改
+    await crud.record.query(
+        _id=[record.id for record in records], is_submit=False
+    ).delete()
+
+    task_records = defaultdict(list)
+    for record in records:
+        task_records[record.task_id].append(record)
+    for task_id, items in task_records.items():
+        # 只有仍在加工中的数据需要重置并放回分发队列，已提交等数据跳过
+        datas = (
+            await crud.data.query(
+                task_id=task_id,
+                data_id=[record.data_id for record in items],
+                status=schemas.data.DataStatus.PROCESSING,
+            )
+            .project(schemas.data.ViewDispatchData)
+            .to_list()
+        )
+        if not datas:
+            continue
+
+        result = await crud.data.query(
+            task_id=task_id,
+            data_id=[data.data_id for data in datas],
+            status=schemas.data.DataStatus.PROCESSING,
+        ).set(
+            {
+                models.data.Data.status: schemas.data.DataStatus.PENDING,
+                models.data.Data.update_time: int(time.time()),
+            }
+        )  # type: ignore
+        await progress.move(
+            task_id,
+            schemas.data.DataStatus.PROCESSING,
+            schemas.data.DataStatus.PENDING,
+            result.modified_count if result else 0,
+        )
+
+        # 回收的数据重新放入分发队列
+        await dispatch.push_dispatch_queue(task_id, datas)
+
+    return len(records)
+
+
+async def reclaim_records(record_ids: list) -> int:
+    """
+    批量回收未提交的记录：删除记录，并将加工中的数据重置为待加工
+    """
+    reclaimed = 0
+    for i in range(0, len(record_ids), RECLAIM_BATCH_SIZE):
+        records = (
+            await crud.record.query(
+                _id=record_ids[i : i + RECLAIM_BATCH_SIZE], is_submit=False
+            )
+            .project(schemas.record.ViewRecordData)
+            .to_list()
+        )
+        reclaimed += await _reclaim_batch(records)
+
+    return reclaimed
+
+
+# 回收所有任务中已到期的租约
+async def lease_sweeper_job():
+    try:
+        async with redis_session.lock(
+            LEASE_SWEEPER_JOB_ID, blocking=False, timeout=LEASE_SWEEP_INTERVAL * 6
+        ):
+            reclaimed = 0
+            while True:
+                record_ids = await lease.pop_due_leases(
+                    int(time.time()), LEASE_SWEEP_BATCH
+                )
+                if record_ids:
+                    reclaimed += await reclaim_records(record_ids)
+                if len(record_ids) < LEASE_SWEEP_BATCH:
+                    break
+
+            if reclaimed:
+                logger.info(f"Lease sweeper reclaimed {reclaimed} records")
+
+    except LockError:
+        logger.info("Skip lease sweeper job")
+
+
+# 开放任务定时数据处理：一次聚合找出分片内所有任务的过期记录并回收
+async def task_sweeper_job(shard: int):
+    # 锁用于防止多个进程误配置为同一分片时重复执行
     try:
         async with redis_session.lock(
-            f"label_task_scheduler_job_{task_id}", blocking=False
+            task_sweeper_job_name(shard),
+            blocking=False,
+            timeout=TASK_SWEEP_INTERVAL * 10,
         ):
-            logger.info(f"Start schedulel job for label task {task_id}")
+            start_time = time.time()
 
-            task = await crud.label_task.query(task_id=task_id).first_or_none()
-            if task is None:
-                logger.error(f"Label task {task_id} not found")
-                scheduler.remove_job(job_id=task_scheduler_job_name(task_id))
+            tasks = [
+                task
+                async for task in crud.label_task.query(
+                    status=schemas.task.TaskStatus.OPEN
+                ).project(schemas.task.ViewTaskExpireTime)
+                if task_shard(task.task_id) == shard
+            ]
+            if not tasks:
                 return
 
-            # 清理过期的数据
-            records = await crud.record.query(
-                task_id=task_id,
-                create_time_lt=int(time.time()) - task.expire_time,
-                is_submit=False,
-            ).to_list()
-            for record in records:
-                data = await crud.data.query(data_id=record.data_id).first_or_none()
-                if data is None:
-                    logger.error(f"Data {record.data_id} not found")
-                    continue
-                await crud.record.remove(_id=record.id)
-                await crud.data.update(
-                    db_obj=data,
-                    obj_in=models.data.DataUpdate(
-                        status=schemas.data.DataStatus.PENDING
-                    ),
+            # 按答题限制时间分组，合并为一个查询条件
+            now = int(time.time())
+            expire_time_task_ids = defaultdict(list)
+            for task in tasks:
+                expire_time_task_ids[task.expire_time].append(task.task_id)
+
+            # 流式读取过期记录，按批回收，避免大量记录同时过期时占用过多内存
+            reclaimed = 0
+            expired_task_ids = set()
+            records = []
+            async for record in (
+                crud.record.query(is_submit=False)
+                .find(
+                    {
+                        "$or": [
+                            {
+                                "task_id": {"$in": task_ids},
+                                "create_time": {"$lt": now - expire_time},
+                            }
+                            for expire_time, task_ids in expire_time_task_ids.items()
+                        ]
+                    }
                 )
+                .project(schemas.record.ViewRecordData)
+            ):
+                expired_task_ids.add(record.task_id)
+                records.append(record)
+                if len(records) >= RECLAIM_BATCH_SIZE:
+                    reclaimed += await _reclaim_batch(records)
+                    records = []
+            reclaimed += await _reclaim_batch(records)
+
+            # 分发队列丢失时重建
+            rebuilt = 0
+            for task in tasks:
+                if not await dispatch.has_dispatch_queue(task.task_id):
+                    await dispatch.build_dispatch_queue(task.task_id)
+                    rebuilt += 1
 
-            logger.info(f"Done schedulel job for label task {task_id}")
+            logger.info(
+                f"Task sweeper shard {shard}: {len(tasks)} tasks, "
+                f"{len(expired_task_ids)} tasks with expired records, "
+                f"{reclaimed} records reclaimed, {rebuilt} dispatch queues rebuilt, "
+                f"{time.time() - start_time:.3f}s"
+            )
 
     except LockError:
-        logger.info(f"Skip schedulel job for label task {task_id}")
+        logger.info(f"Skip task sweeper job for shard {shard}")
 
+
+# 根据数据重新统计未结束任务的进度计数，修复增量更新产生的偏差
+async def progress_repair_job():
+    try:
+        async with redis_session.lock(
+            PROGRESS_REPAIR_JOB_ID, blocking=False, timeout=PROGRESS_REPAIR_INTERVAL
+        ):
+            start_time = time.time()
+            task_ids = [
+                task.task_id
+                async for task in crud.label_task.query(
+                    status=[
+                        schemas.task.TaskStatus.CREATED,
+                        schemas.task.TaskStatus.OPEN,
+                    ]
+                ).project(schemas.task.DoTaskBase)
+            ]
+            for i in range(0, len(task_ids), PROGRESS_REPAIR_BATCH):
+                await progress.rebuild_progress(
+                    task_ids[i : i + PROGRESS_REPAIR_BATCH]
+                )
+
+            logger.info(
+                f"Progress repair job: {len(task_ids)} tasks, "
+                f"{time.time() - start_time:.3f}s"
+            )
+
+    except LockError:
+        logger.info("Skip progress repair job")
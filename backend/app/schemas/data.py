@@ -60,6 +60,11 @@ class DataFormat(str, Enum):
     RAW_LABEL_AUDIT = "raw_label_audit"
 
 
+class ViewDispatchData(BaseModel):
+    data_id: UUID
+    questionnaire_id: UUID
+
+
 class DoDataBase(BaseModel):
     """
     任务基础信息
@@ -114,6 +119,10 @@ class RespGetData(DoDataForUser):
     remain_time: int = Field(description="剩余时间")
 
 
+class RespGetDataBatch(BaseModel):
+    list: list[RespGetData]
+
+
 class RespGetAuditData(DoDataBase):
     prompt: str = Field(description="任务提示")
     conversation: list[MessageBase] = Field(description="对话内容")
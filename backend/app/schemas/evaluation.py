@@ -1,6 +1,15 @@
+from enum import StrEnum
+
 from pydantic import BaseModel, Field
 
 
+# 答案归类，schemas.operator.stats 中也使用
+class ANSWER_SCOPE(StrEnum):
+    CONVERSATION = "conversation"
+    QUESTION = "question"
+    MESSAGE = "message"
+
+
 class QuestionnaireEvaluation(BaseModel):
     is_invalid_questionnaire: bool = Field(description="是否为无效问卷", default=False)
 
@@ -22,6 +31,21 @@ class LabelEvaluation(BaseModel):
     )
 
 
+class EvaluationIndex(BaseModel):
+    """
+    展开后的评价，每个元素对应一条消息（或整个对话）中一个问题的答案
+    """
+
+    # 答案归类
+    scope: ANSWER_SCOPE = Field(description="答案归类")
+
+    # 问题 value 值
+    question: str = Field(description="问题 value 值")
+
+    # 选项 value 值，单选题只有一个元素
+    answer: list[str] = Field(description="选项 value 值")
+
+
 class AuditEvaluation(BaseModel):
     # 针对本条数据的评价
     data_evaluation: list[dict] | None = Field(
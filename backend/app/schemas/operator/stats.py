@@ -3,14 +3,9 @@ from uuid import UUID
 
 from pydantic import BaseModel, Field, validator
 
-MESSAGE_QUESTION_FIELD_NAME = "__sys_message_type"
-
+from app.schemas.evaluation import ANSWER_SCOPE
 
-# 更新需求
-class ANSWER_SCOPE(StrEnum):
-    CONVERSATION = "conversation"
-    QUESTION = "question"
-    MESSAGE = "message"
+MESSAGE_QUESTION_FIELD_NAME = "__sys_message_type"
 
 
 class ANSWER_FLITER_KIND(StrEnum):
@@ -33,6 +33,44 @@ class QualifiedStatus(StrEnum):
     # 不合格
     DISCARDED = "discarded"
 
+class ExportFormat(StrEnum):
+    """
+    导出格式
+    """
+    # 每行一个 json
+    JSONL = "jsonl"
+    # 列式存储
+    PARQUET = "parquet"
+
+class WorkloadExportFormat(StrEnum):
+    """
+    工作量导出格式
+    """
+    XLSX = "xlsx"
+    CSV = "csv"
+
+class ExportKind(StrEnum):
+    """
+    导出内容
+    """
+    # 数据
+    DATA = "data"
+    # 标注记录
+    RECORD = "record"
+
+class ExportJobStatus(StrEnum):
+    """
+    导出任务状态
+    """
+    # 排队中
+    PENDING = "pending"
+    # 导出中
+    RUNNING = "running"
+    # 已完成
+    COMPLETED = "completed"
+    # 失败
+    FAILED = "failed"
+
 class RecordPosLocateKind(StrEnum):
     NEXT = "next"
     PRE = "prev"
@@ -289,3 +327,28 @@ class RespLabelTaskCreateWithDataBase(BaseModel):
 
 class RespLabelTaskCreateWithData(BaseModel):
     data: list[RespLabelTaskCreateWithDataBase] = Field(description="数据")
+
+
+class ReqCreateExportJob(BaseModel):
+    kind: ExportKind = Field(description="导出内容")
+    task_id: list[UUID] = Field(description="任务 id", min_length=1)
+    export_format: ExportFormat = Field(
+        description="导出格式", default=ExportFormat.JSONL
+    )
+    submit: SubmitStatus | None = Field(description="提交状态，仅导出数据时有效", default=None)
+    qualified: QualifiedStatus | None = Field(
+        description="合格状态，仅导出数据时有效", default=None
+    )
+    invalid: bool | None = Field(description="是否无效问卷，仅导出数据时有效", default=None)
+
+
+class RespExportJob(BaseModel):
+    job_id: UUID = Field(description="导出任务 id")
+    status: ExportJobStatus = Field(description="导出任务状态")
+    processed: int = Field(description="已导出数量", default=0)
+    total: int = Field(description="总数量", default=0)
+    filename: str | None = Field(description="文件名", default=None)
+    url: str | None = Field(description="下载地址，支持断点续传", default=None)
+    error: str | None = Field(description="失败原因", default=None)
+    create_time: int = Field(description="创建时间")
+    update_time: int = Field(description="更新时间")
@@ -1,5 +1,7 @@
 from enum import Enum
+from uuid import UUID
 
+from beanie import PydanticObjectId
 from pydantic import BaseModel, Field
 
 from app.schemas.data import DoDataBase
@@ -38,6 +40,13 @@ class RecordFullStatus(str, Enum):
     INVALID = "invalid"
 
 
+class ViewRecordData(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    data_id: UUID
+    task_id: UUID
+    questionnaire_id: UUID
+
+
 class ViewGroupUser(BaseModel):
     user_id: str = Field(description="用户id", alias="_id")
     completed_data_count: int = Field(description="答题数")
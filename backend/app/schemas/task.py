@@ -46,9 +46,34 @@ class ViewTaskCompleted(BaseModel):
     completed: int
 
 
-class ViewTaskRemain(BaseModel):
+class ViewTaskExpireTime(BaseModel):
+    task_id: UUID
+    expire_time: int
+
+
+class ViewTaskUserRecord(BaseModel):
     task_id: UUID = Field(alias="_id")
-    remain: int
+    completed: int
+    unsubmitted: int
+    # 未提交记录的问卷，已提交的记录为 None
+    unsubmitted_questionnaire_ids: list[UUID | None]
+
+
+class ViewTaskUserKey(BaseModel):
+    task_id: UUID
+    creator_id: str
+
+
+class ViewTaskUserWorkload(BaseModel):
+    id: ViewTaskUserKey = Field(alias="_id")
+    count: int
+    discarded: int
+    duration: int
+
+
+class ViewTaskQuestionnaire(BaseModel):
+    task_id: UUID
+    questionnaire_id: UUID
 
 
 class DoTaskBase(BaseModel):
@@ -59,6 +84,14 @@ class DoTaskBase(BaseModel):
     task_id: UUID = Field(description="任务id")
 
 
+class ReqGetDataBatch(DoTaskBase):
+    """
+    批量获取数据
+    """
+
+    count: int = Field(description="获取数量", default=1, gt=0, le=50)
+
+
 class DoTaskKindBase(DoTaskBase):
     """
     任务基础信息
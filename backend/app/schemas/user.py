@@ -65,6 +65,19 @@ class UserLoginRequest(BaseModel):
     username: str = Field(..., description="用户名")
     password: str = Field(..., description="密码")
 
+
+class ReqBatchCreateUser(BaseModel):
+    users: list[UserLoginRequest] = Field(
+        ..., description="用户列表", min_length=1, max_length=1000
+    )
+    team_id: UUID | None = Field(description="加入的团队id，默认为默认团队", default=None)
+
+
+class RespBatchCreateUser(BaseModel):
+    duplicated: list[str] = Field(description="已存在的用户名")
+    list: list[UserInfo]
+
+
 class RespMe(DoUser):
     name: str = Field(..., description="用户名")
     teams: list[TeamMember] | None = Field(description="teams that user joined", default=None)
@@ -0,0 +1,276 @@
+from typing import Any
+from uuid import UUID
+
+import orjson
+from redis.exceptions import LockError
+
+from app import crud, models, schemas
+from app.core import exceptions
+from app.db.session import redis_session
+from app.schemas.operator.stats import (
+    ANSWER_SCOPE,
+    CHOICE_KIND,
+    MESSAGE_QUESTION_FIELD_NAME,
+)
+from app.util.stats import (
+    MESSAGE_TYPE,
+    QUESTION_TYPE,
+    build_agg_choice_count_facet,
+    choice_facet_name,
+    extract_choice_config,
+)
+
+# 选项计数已构建的标记
+CHOICE_STATS_MARKER = "__built"
+# 重新统计期间计数发生变化的标记，统计结果不再准确
+CHOICE_STATS_DIRTY = "__dirty"
+# 选项计数的过期时间（秒），过期后读取时重新统计，修正可能的偏差
+CHOICE_STATS_EXPIRE = 7 * 24 * 60 * 60
+# 重新统计的锁超时时间（秒），也是等待其他进程重新统计的最长时间
+CHOICE_STATS_LOCK_TIMEOUT = 10 * 60
+# 重新统计时每批写入的字段数量
+CHOICE_STATS_BATCH = 1000
+
+# 正在重新统计时标记结果不准确；计数已构建时才增量更新，避免产生不完整的计数
+# KEYS: 计数, 重新统计中的计数
+# ARGV: 构建标记, 变化标记, (字段, 增量)...
+_incr_choice_stats_script = redis_session.register_script("""
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        redis.call('HSET', KEYS[2], ARGV[2], 1)
+    end
+    if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+        return 0
+    end
+    for i = 3, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    return 1
+    """)
+
+# 统计期间没有变化时将重新统计的计数替换为正式计数，否则两者都丢弃，下次读取时重新统计
+# KEYS: 重新统计中的计数, 计数
+# ARGV: 构建标记, 变化标记, 过期时间
+_finish_choice_stats_script = redis_session.register_script("""
+    if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0
+        or redis.call('HEXISTS', KEYS[1], ARGV[2]) == 1 then
+        redis.call('DEL', KEYS[1], KEYS[2])
+        return 0
+    end
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    return 1
+    """)
+
+
+def choice_stats_key(task_id: UUID, scope: ANSWER_SCOPE) -> str:
+    return f"stats:choice:{task_id}:{scope}"
+
+
+def building_choice_stats_key(task_id: UUID, scope: ANSWER_SCOPE) -> str:
+    return f"stats:choice:building:{task_id}:{scope}"
+
+
+def rebuild_lock_name(task_id: UUID) -> str:
+    return f"choice_stats_rebuild_{task_id}"
+
+
+def _field(question: str, value: str) -> str:
+    return orjson.dumps([question, value]).decode("utf-8")
+
+
+def choice_questions(tool_config: dict, scope: ANSWER_SCOPE) -> dict[str, CHOICE_KIND]:
+    return {
+        v["value"]: v["type"]
+        for v in extract_choice_config(tool_config, scope)
+        if v.get("value")
+    }
+
+
+def _answer_values(value: Any, kind: CHOICE_KIND) -> list[str]:
+    """
+    单选题取答案本身，多选题取每个选项，与聚合统计中 $unwind 的行为一致
+    """
+    if value is None or isinstance(value, dict):
+        return []
+    if isinstance(value, list):
+        if kind != CHOICE_KIND.ARRAY:
+            return []
+        return [str(v) for v in value if v is not None and not isinstance(v, dict)]
+    return [str(value)]
+
+
+def choice_values(
+    evaluation: schemas.evaluation.LabelEvaluation | None,
+    scope: ANSWER_SCOPE,
+    questions: dict[str, CHOICE_KIND],
+) -> set[tuple[str, str]]:
+    """
+    一条数据在某个范围内选择的 (问题, 选项)，同一条数据的相同选项只计一次
+    """
+    if evaluation is None or not questions:
+        return set()
+
+    if scope == ANSWER_SCOPE.CONVERSATION:
+        answers_list = [evaluation.conversation_evaluation or {}]
+    else:
+        message_type = MESSAGE_TYPE if scope == ANSWER_SCOPE.MESSAGE else QUESTION_TYPE
+        answers_list = [
+            answers
+            for answers in (evaluation.message_evaluation or {}).values()
+            if isinstance(answers, dict)
+            and answers.get(MESSAGE_QUESTION_FIELD_NAME) == message_type
+        ]
+
+    values = set()
+    for answers in answers_list:
+        for question, kind in questions.items():
+            for value in _answer_values(answers.get(question), kind):
+                values.add((question, value))
+    return values
+
+
+async def update(
+    task: models.label_task.LabelTask,
+    old_evaluation: schemas.evaluation.LabelEvaluation | None,
+    new_evaluation: schemas.evaluation.LabelEvaluation | None,
+) -> None:
+    """
+    已完成数据的评价变化后更新计数，old_evaluation 为原来计入统计的评价
+    """
+    for scope in ANSWER_SCOPE:
+        questions = choice_questions(task.tool_config, scope)
+        old_values = choice_values(old_evaluation, scope, questions)
+        new_values = choice_values(new_evaluation, scope, questions)
+
+        args: list[str | int] = []
+        for question, value in old_values - new_values:
+            args.extend([_field(question, value), -1])
+        for question, value in new_values - old_values:
+            args.extend([_field(question, value), 1])
+        if args:
+            await _incr_choice_stats_script(
+                keys=[
+                    choice_stats_key(task.task_id, scope),
+                    building_choice_stats_key(task.task_id, scope),
+                ],
+                args=[CHOICE_STATS_MARKER, CHOICE_STATS_DIRTY, *args],
+            )
+
+
+async def remove(task_id: UUID) -> None:
+    await redis_session.delete(
+        *[choice_stats_key(task_id, scope) for scope in ANSWER_SCOPE],
+        *[building_choice_stats_key(task_id, scope) for scope in ANSWER_SCOPE],
+    )
+
+
+def _parse_counts(items: dict[bytes, bytes]) -> dict[tuple[str, str], int]:
+    return {
+        tuple(orjson.loads(field)): int(count)
+        for field, count in items.items()
+        if field not in (
+            CHOICE_STATS_MARKER.encode("utf-8"),
+            CHOICE_STATS_DIRTY.encode("utf-8"),
+        )
+    }
+
+
+async def _rebuild(task: models.label_task.LabelTask) -> dict[ANSWER_SCOPE, dict]:
+    """
+    写入临时的计数后再统计，统计期间的增量更新会将其标记为不准确，完成后原子地替换正式计数
+    """
+    questions = [
+        (scope, kind, question)
+        for scope in ANSWER_SCOPE
+        for question, kind in choice_questions(task.tool_config, scope).items()
+    ]
+
+    async with redis_session.pipeline(transaction=True) as pipe:
+        for scope in ANSWER_SCOPE:
+            building_key = building_choice_stats_key(task.task_id, scope)
+            pipe.delete(building_key)
+            pipe.hset(building_key, CHOICE_STATS_MARKER, 1)
+            pipe.expire(building_key, CHOICE_STATS_LOCK_TIMEOUT)
+        await pipe.execute()
+
+    counts: dict[ANSWER_SCOPE, dict[str, int]] = {scope: {} for scope in ANSWER_SCOPE}
+    if questions:
+        # 所有问题在一次聚合中统计
+        result = await (
+            crud.data.query(
+                task_id=task.task_id, status=schemas.data.DataStatus.COMPLETED
+            )
+            .aggregate(build_agg_choice_count_facet(questions), allowDiskUse=True)
+            .to_list()
+        )
+        facets = result[0] if result else {}
+        for index, (scope, _, question) in enumerate(questions):
+            for item in facets.get(choice_facet_name(index), []):
+                if item["_id"] is None or isinstance(item["_id"], (dict, list)):
+                    continue
+                counts[scope][_field(question, str(item["_id"]))] = item["count"]
+
+    async with redis_session.pipeline(transaction=True) as pipe:
+        for scope in ANSWER_SCOPE:
+            building_key = building_choice_stats_key(task.task_id, scope)
+            items = list(counts[scope].items())
+            for i in range(0, len(items), CHOICE_STATS_BATCH):
+                pipe.hset(building_key, mapping=dict(items[i : i + CHOICE_STATS_BATCH]))
+        await pipe.execute()
+
+    for scope in ANSWER_SCOPE:
+        await _finish_choice_stats_script(
+            keys=[
+                building_choice_stats_key(task.task_id, scope),
+                choice_stats_key(task.task_id, scope),
+            ],
+            args=[CHOICE_STATS_MARKER, CHOICE_STATS_DIRTY, CHOICE_STATS_EXPIRE],
+        )
+
+    return {
+        scope: {
+            tuple(orjson.loads(field)): count for field, count in counts[scope].items()
+        }
+        for scope in ANSWER_SCOPE
+    }
+
+
+async def rebuild(task: models.label_task.LabelTask) -> dict[ANSWER_SCOPE, dict]:
+    """
+    根据任务已完成的数据重新统计所有范围的选项计数，同一任务同时只有一个进程统计
+    """
+    try:
+        async with redis_session.lock(
+            rebuild_lock_name(task.task_id),
+            timeout=CHOICE_STATS_LOCK_TIMEOUT,
+            blocking_timeout=CHOICE_STATS_LOCK_TIMEOUT,
+        ):
+            return await _rebuild(task)
+    except LockError:
+        raise exceptions.SERVER_ERROR
+
+
+async def get_counts(
+    task: models.label_task.LabelTask, scope: ANSWER_SCOPE
+) -> dict[tuple[str, str], int]:
+    """
+    获取 (问题, 选项) 的数据数量，计数不存在时重新统计
+    """
+    key = choice_stats_key(task.task_id, scope)
+    items = await redis_session.hgetall(key)
+    if CHOICE_STATS_MARKER.encode("utf-8") in items:
+        return _parse_counts(items)
+
+    try:
+        async with redis_session.lock(
+            rebuild_lock_name(task.task_id),
+            timeout=CHOICE_STATS_LOCK_TIMEOUT,
+            blocking_timeout=CHOICE_STATS_LOCK_TIMEOUT,
+        ):
+            # 等待锁期间其他进程可能已经完成统计
+            items = await redis_session.hgetall(key)
+            if CHOICE_STATS_MARKER.encode("utf-8") in items:
+                return _parse_counts(items)
+            return (await _rebuild(task))[scope]
+    except LockError:
+        raise exceptions.SERVER_ERROR
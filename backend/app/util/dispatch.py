@@ -0,0 +1,394 @@
+import random
+from uuid import UUID
+
+from app import crud, schemas
+from app.db.session import redis_session
+
+# 每次写入队列的批量大小
+DISPATCH_PUSH_BATCH = 1000
+# 单次获取最多跳过的数量，超过后回退到 Mongo 查询
+DISPATCH_MAX_SKIP = 256
+# 用户已完成问卷集合的过期时间（秒）
+DONE_QUESTIONNAIRE_EXPIRE = 7 * 24 * 60 * 60
+# 用户已完成问卷集合已构建的标记
+DONE_QUESTIONNAIRE_MARKER = "built"
+# 任务待加工问卷集合的过期时间（秒），过期后重新统计
+PENDING_QUESTIONNAIRE_EXPIRE = 60
+# 任务待加工问卷集合已构建的标记
+PENDING_QUESTIONNAIRE_MARKER = "pending_built"
+
+# 弹出队首数据，跳过用户已做过、额外排除或本次已选中的问卷，跳过的数据放回队尾
+# ARGV: 数量, 最多跳过数量, 额外排除的问卷id...
+# 返回 [队列是否已空, 选中的数据]
+_pop_dispatch_script = redis_session.register_script(
+    """
+local count = tonumber(ARGV[1])
+local max_skip = tonumber(ARGV[2])
+local picked = {}
+local picked_questionnaire = {}
+local skipped = {}
+local exhausted = 0
+for i = 3, #ARGV do
+    picked_questionnaire[ARGV[i]] = true
+end
+while #picked < count and #skipped < max_skip do
+    local item = redis.call("LPOP", KEYS[1])
+    if not item then
+        exhausted = 1
+        break
+    end
+    local questionnaire_id = string.sub(item, string.find(item, ":", 1, true) + 1)
+    if picked_questionnaire[questionnaire_id]
+        or redis.call("SISMEMBER", KEYS[2], questionnaire_id) == 1 then
+        table.insert(skipped, item)
+    else
+        picked_questionnaire[questionnaire_id] = true
+        table.insert(picked, item)
+    end
+end
+if #skipped > 0 then
+    redis.call("RPUSH", KEYS[1], unpack(skipped))
+end
+return {exhausted, picked}
+"""
+)
+
+# 统计待加工问卷中用户未做过的数量，遍历两个集合中较小的一个
+# KEYS: 待加工问卷集合, 用户已完成问卷集合
+# ARGV: 待加工问卷集合构建标记, 额外排除的问卷id...
+_count_remain_script = redis_session.register_script(
+    """
+local excluded = {}
+local count = 0
+excluded[ARGV[1]] = true
+for i = 2, #ARGV do
+    if not excluded[ARGV[i]] and redis.call("SISMEMBER", KEYS[1], ARGV[i]) == 1 then
+        excluded[ARGV[i]] = true
+        count = count + 1
+    end
+end
+local pending = redis.call("SCARD", KEYS[1]) - redis.call("SISMEMBER", KEYS[1], ARGV[1])
+if redis.call("SCARD", KEYS[2]) < pending then
+    for _, questionnaire_id in ipairs(redis.call("SMEMBERS", KEYS[2])) do
+        if not excluded[questionnaire_id]
+            and redis.call("SISMEMBER", KEYS[1], questionnaire_id) == 1 then
+            excluded[questionnaire_id] = true
+            count = count + 1
+        end
+    end
+else
+    for _, questionnaire_id in ipairs(redis.call("SMEMBERS", KEYS[1])) do
+        if not excluded[questionnaire_id]
+            and redis.call("SISMEMBER", KEYS[2], questionnaire_id) == 1 then
+            count = count + 1
+        end
+    end
+end
+return pending - count
+"""
+)
+
+
+def dispatch_queue_key(task_id: UUID) -> str:
+    return f"task:dispatch:queue:{task_id}"
+
+
+def dispatch_ready_key(task_id: UUID) -> str:
+    return f"task:dispatch:ready:{task_id}"
+
+
+def done_questionnaire_key(task_id: UUID, user_id: str) -> str:
+    return f"task:done:{task_id}:{user_id}"
+
+
+def pending_questionnaire_key(task_id: UUID) -> str:
+    return f"task:pending:questionnaire:{task_id}"
+
+
+def encode_dispatch_item(data_id: UUID, questionnaire_id: UUID) -> str:
+    return f"{data_id}:{questionnaire_id}"
+
+
+def decode_dispatch_item(item: bytes | str) -> tuple[UUID, UUID]:
+    if isinstance(item, bytes):
+        item = item.decode("utf-8")
+    data_id, questionnaire_id = item.split(":", 1)
+    return UUID(data_id), UUID(questionnaire_id)
+
+
+async def has_dispatch_queue(task_id: UUID) -> bool:
+    return bool(await redis_session.exists(dispatch_ready_key(task_id)))
+
+
+async def build_dispatch_queue(task_id: UUID) -> int:
+    """
+    根据待加工的数据重建任务的分发队列（打乱顺序）
+    """
+    items = [
+        encode_dispatch_item(data.data_id, data.questionnaire_id)
+        async for data in crud.data.query(
+            task_id=task_id, status=schemas.data.DataStatus.PENDING
+        ).project(schemas.data.ViewDispatchData)
+    ]
+    random.shuffle(items)
+
+    queue_key = dispatch_queue_key(task_id)
+    async with redis_session.pipeline(transaction=True) as pipe:
+        pipe.delete(queue_key)
+        for i in range(0, len(items), DISPATCH_PUSH_BATCH):
+            pipe.rpush(queue_key, *items[i : i + DISPATCH_PUSH_BATCH])
+        pipe.set(dispatch_ready_key(task_id), 1)
+        await pipe.execute()
+
+    return len(items)
+
+
+async def push_dispatch_queue(task_id: UUID, datas: list) -> None:
+    """
+    将重新变为待加工的数据放回分发队列，队列不存在时不处理
+    """
+    if not datas:
+        return
+
+    if not await has_dispatch_queue(task_id):
+        return
+
+    items = [
+        encode_dispatch_item(data.data_id, data.questionnaire_id) for data in datas
+    ]
+    random.shuffle(items)
+
+    queue_key = dispatch_queue_key(task_id)
+    async with redis_session.pipeline(transaction=False) as pipe:
+        for i in range(0, len(items), DISPATCH_PUSH_BATCH):
+            pipe.rpush(queue_key, *items[i : i + DISPATCH_PUSH_BATCH])
+        await pipe.execute()
+
+
+async def pop_dispatch_queue(
+    task_id: UUID,
+    user_id: str,
+    count: int = 1,
+    exclude_questionnaire_ids: set[UUID] | None = None,
+) -> list[tuple[UUID, UUID]] | None:
+    """
+    从分发队列中弹出最多 count 条数据（问卷不重复），跳过用户已做过的问卷
+
+    调用前需要保证用户已完成问卷集合已构建（ensure_done_questionnaires）
+    返回 None 表示队列丢失或无法确定结果，调用方需要回退到 Mongo 查询
+    """
+    if not await has_dispatch_queue(task_id):
+        return None
+
+    exhausted, items = await _pop_dispatch_script(
+        keys=[
+            dispatch_queue_key(task_id),
+            done_questionnaire_key(task_id, user_id),
+        ],
+        args=[
+            count,
+            DISPATCH_MAX_SKIP,
+            *[str(i) for i in exclude_questionnaire_ids or []],
+        ],
+    )
+
+    picked = [decode_dispatch_item(item) for item in items]
+    if not picked and not exhausted:
+        return None
+
+    return picked
+
+
+async def remove_dispatch_queue(task_id: UUID) -> None:
+    await redis_session.delete(dispatch_queue_key(task_id), dispatch_ready_key(task_id))
+
+
+async def ensure_done_questionnaires(task_id: UUID, user_id: str) -> None:
+    """
+    保证用户已完成问卷集合可用，不存在时根据已提交的记录构建
+    """
+    await ensure_done_questionnaires_many([task_id], user_id)
+
+
+async def ensure_done_questionnaires_many(task_ids: list[UUID], user_id: str) -> None:
+    """
+    保证用户在多个任务中的已完成问卷集合可用，不存在的一次性根据已提交的记录构建
+    """
+    async with redis_session.pipeline(transaction=False) as pipe:
+        for task_id in task_ids:
+            pipe.sismember(
+                done_questionnaire_key(task_id, user_id), DONE_QUESTIONNAIRE_MARKER
+            )
+        exists = await pipe.execute()
+
+    missing = []
+    async with redis_session.pipeline(transaction=False) as pipe:
+        for task_id, ok in zip(task_ids, exists):
+            if ok:
+                pipe.expire(
+                    done_questionnaire_key(task_id, user_id), DONE_QUESTIONNAIRE_EXPIRE
+                )
+            else:
+                missing.append(task_id)
+        await pipe.execute()
+    if not missing:
+        return
+
+    questionnaire_ids: dict[UUID, list[str]] = {task_id: [] for task_id in missing}
+    async for item in crud.record.query(
+        task_id=missing, user_id=user_id, is_submit=True
+    ).aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {
+                        "task_id": "$task_id",
+                        "questionnaire_id": "$questionnaire_id",
+                    },
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "task_id": "$_id.task_id",
+                    "questionnaire_id": "$_id.questionnaire_id",
+                }
+            },
+        ],
+        projection_model=schemas.task.ViewTaskQuestionnaire,
+        allowDiskUse=True,
+    ):
+        questionnaire_ids[item.task_id].append(str(item.questionnaire_id))
+
+    # 构建期间提交的问卷已直接写入集合，这里只追加，不删除已有成员
+    async with redis_session.pipeline(transaction=True) as pipe:
+        for task_id, items in questionnaire_ids.items():
+            key = done_questionnaire_key(task_id, user_id)
+            for i in range(0, len(items), DISPATCH_PUSH_BATCH):
+                pipe.sadd(key, *items[i : i + DISPATCH_PUSH_BATCH])
+            pipe.sadd(key, DONE_QUESTIONNAIRE_MARKER)
+            pipe.expire(key, DONE_QUESTIONNAIRE_EXPIRE)
+        await pipe.execute()
+
+
+async def get_done_questionnaires(task_id: UUID, user_id: str) -> set[UUID]:
+    await ensure_done_questionnaires(task_id, user_id)
+    members = await redis_session.smembers(done_questionnaire_key(task_id, user_id))
+    return {
+        UUID(member.decode("utf-8"))
+        for member in members
+        if member.decode("utf-8") != DONE_QUESTIONNAIRE_MARKER
+    }
+
+
+async def add_done_questionnaire(
+    task_id: UUID, user_id: str, questionnaire_id: UUID
+) -> None:
+    """
+    记录用户已完成的问卷
+
+    集合未构建时也直接写入，之后构建时会补全，避免构建过程中提交的问卷丢失
+    """
+    key = done_questionnaire_key(task_id, user_id)
+    async with redis_session.pipeline(transaction=False) as pipe:
+        pipe.sadd(key, str(questionnaire_id))
+        pipe.expire(key, DONE_QUESTIONNAIRE_EXPIRE)
+        await pipe.execute()
+
+
+async def remove_done_questionnaires(
+    task_id: UUID, user_ids: list[str] | None = None
+) -> None:
+    """
+    使用户已完成问卷集合失效，不指定用户时清理任务下所有用户
+    """
+    if user_ids is not None:
+        keys = [done_questionnaire_key(task_id, user_id) for user_id in user_ids]
+    else:
+        keys = [
+            key
+            async for key in redis_session.scan_iter(
+                match=done_questionnaire_key(task_id, "*")
+            )
+        ]
+
+    if keys:
+        await redis_session.delete(*keys)
+
+
+async def ensure_pending_questionnaires(task_ids: list[UUID]) -> None:
+    """
+    保证任务的待加工问卷集合可用，不存在的一次性从 Mongo 统计
+    """
+    async with redis_session.pipeline(transaction=False) as pipe:
+        for task_id in task_ids:
+            pipe.exists(pending_questionnaire_key(task_id))
+        exists = await pipe.execute()
+    missing = [task_id for task_id, ok in zip(task_ids, exists) if not ok]
+    if not missing:
+        return
+
+    questionnaire_ids: dict[UUID, list[str]] = {task_id: [] for task_id in missing}
+    async for item in crud.data.query(
+        task_id=missing, status=schemas.data.DataStatus.PENDING
+    ).aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {
+                        "task_id": "$task_id",
+                        "questionnaire_id": "$questionnaire_id",
+                    },
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "task_id": "$_id.task_id",
+                    "questionnaire_id": "$_id.questionnaire_id",
+                }
+            },
+        ],
+        projection_model=schemas.task.ViewTaskQuestionnaire,
+        allowDiskUse=True,
+    ):
+        questionnaire_ids[item.task_id].append(str(item.questionnaire_id))
+
+    # 每个集合在事务中整体替换，读取时不会看到构建了一半的集合
+    async with redis_session.pipeline(transaction=True) as pipe:
+        for task_id, items in questionnaire_ids.items():
+            key = pending_questionnaire_key(task_id)
+            pipe.delete(key)
+            for i in range(0, len(items), DISPATCH_PUSH_BATCH):
+                pipe.sadd(key, *items[i : i + DISPATCH_PUSH_BATCH])
+            pipe.sadd(key, PENDING_QUESTIONNAIRE_MARKER)
+            pipe.expire(key, PENDING_QUESTIONNAIRE_EXPIRE)
+        await pipe.execute()
+
+
+async def count_remain_questionnaires(
+    task_ids: list[UUID],
+    user_id: str,
+    exclude_questionnaire_ids: dict[UUID, list[UUID]],
+) -> dict[UUID, int]:
+    """
+    统计各任务中用户未做过的待加工问卷数量，在 Redis 中比较集合，不向 Mongo 发送用户的历史问卷
+    """
+    await ensure_pending_questionnaires(task_ids)
+    await ensure_done_questionnaires_many(task_ids, user_id)
+
+    async with redis_session.pipeline(transaction=False) as pipe:
+        for task_id in task_ids:
+            await _count_remain_script(
+                keys=[
+                    pending_questionnaire_key(task_id),
+                    done_questionnaire_key(task_id, user_id),
+                ],
+                args=[
+                    PENDING_QUESTIONNAIRE_MARKER,
+                    *[str(v) for v in exclude_questionnaire_ids.get(task_id, [])],
+                ],
+                client=pipe,
+            )
+        counts = await pipe.execute()
+    return dict(zip(task_ids, counts))
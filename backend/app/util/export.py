@@ -0,0 +1,281 @@
+import csv
+import io
+import tempfile
+import types
+import typing
+import zipfile
+from typing import IO, Any, AsyncGenerator, AsyncIterable, Callable, Iterable, Iterator
+from uuid import UUID
+
+import orjson
+from beanie.odm.queries.find import FindMany
+from bson import Binary, ObjectId
+from bson.binary import UUID_SUBTYPE
+from openpyxl import Workbook
+from pydantic import BaseModel
+
+# 压缩数据累计到该大小后输出
+ZIP_FLUSH_SIZE = 256 * 1024
+# 导出数据累计到该大小后输出
+EXPORT_FLUSH_SIZE = 256 * 1024
+# 导出时每批读取的文档数量
+EXPORT_BATCH_SIZE = 1000
+# 读取临时文件的块大小
+FILE_CHUNK_SIZE = 256 * 1024
+
+
+class StreamBuffer(io.RawIOBase):
+    """
+    不可 seek 的写缓冲区，ZipFile 写入的数据可以随时取出
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._size = 0
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._size += len(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self._size = 0
+        return data
+
+
+async def stream_zip(
+    entries: AsyncIterable[tuple[str, AsyncIterable[str | bytes]]],
+) -> AsyncGenerator[bytes, None]:
+    """
+    流式生成 zip 文件，边读取每个文件的内容边压缩输出，内存占用与文件大小无关
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        async for name, content in entries:
+            with zip_file.open(name, "w", force_zip64=True) as f:
+                async for chunk in content:
+                    f.write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+                    if buffer.size >= ZIP_FLUSH_SIZE:
+                        yield buffer.pop()
+            yield buffer.pop()
+
+    # 写入中央目录
+    yield buffer.pop()
+
+
+def unique_titles(titles: list[str]) -> list[str]:
+    """
+    重名的标题依次加上 (1)、(2) 等后缀
+    """
+    title_count: dict[str, int] = {}
+    result = []
+    for title in titles:
+        if title not in title_count:
+            title_count[title] = 1
+            result.append(title)
+        else:
+            result.append(f"{title}({title_count[title]})")
+            title_count[title] += 1
+    return result
+
+
+# 可以直接交给 orjson 的类型
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _uuid_str(value: Binary) -> str:
+    """
+    直接从 16 字节生成 UUID 字符串，比构造 uuid.UUID 快得多
+    """
+    h = value.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def write_xlsx(headers: list[str], rows: Iterable[list]) -> IO[bytes]:
+    """
+    以 write-only 模式逐行写入 xlsx，结果保存在临时文件中
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+
+    fp = tempfile.TemporaryFile()
+    wb.save(fp)
+    fp.seek(0)
+    return fp
+
+
+def iter_file(fp: IO[bytes]) -> Iterator[bytes]:
+    """
+    分块读取文件，读取完成后关闭
+    """
+    with fp:
+        while chunk := fp.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def stream_csv(headers: list[str], rows: Iterable[list]) -> Iterator[bytes]:
+    """
+    逐行生成 csv，带 BOM 以便 Excel 正确识别编码
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_FLUSH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _plain(value: Any) -> Any:
+    """
+    将 BSON 类型转换为 orjson 可直接序列化的类型
+    """
+    if isinstance(value, _SCALAR_TYPES):
+        return value
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return _uuid_str(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def _to_uuid(value: Any) -> Any:
+    if isinstance(value, Binary):
+        return _uuid_str(value)
+    return value
+
+
+def _annotation_converter(annotation: Any) -> Callable[[Any], Any]:
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            convert = _annotation_converter(args[0])
+            return lambda value: None if value is None else convert(value)
+        return _plain
+    if origin is list:
+        (item_type,) = typing.get_args(annotation) or (Any,)
+        convert = _annotation_converter(item_type)
+        if convert is _plain:
+            return _plain
+        return lambda value: [convert(item) for item in value]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return DocumentSerializer(annotation)
+    if annotation is UUID:
+        return _to_uuid
+    return _plain
+
+
+class DocumentSerializer:
+    """
+    按 pydantic 模型的字段顺序和默认值，把原始 mongo 文档转换为可直接用 orjson 序列化的 dict，
+    输出与 model_dump_json 一致，但不做逐字段校验
+    """
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        self.model = model
+        self.fields: list[tuple[str, Callable[[Any], Any], Callable[[], Any]]] = []
+        for name, field in model.model_fields.items():
+            self.fields.append(
+                (
+                    name,
+                    _annotation_converter(field.annotation),
+                    self._default_factory(field),
+                )
+            )
+
+    @staticmethod
+    def _default_factory(field) -> Callable[[], Any]:
+        if field.is_required():
+            return lambda: None
+
+        def factory():
+            default = field.get_default(call_default_factory=True)
+            if isinstance(default, BaseModel):
+                return default.model_dump(mode="json")
+            return default
+
+        return factory
+
+    @property
+    def projection(self) -> dict[str, int]:
+        return {"_id": 0, **{name: 1 for name, _, _ in self.fields}}
+
+    def __call__(self, doc: dict) -> dict:
+        result = {}
+        get = doc.get
+        for name, convert, default in self.fields:
+            value = get(name, ...)
+            if value is ...:
+                result[name] = default()
+            elif value is None or convert is _plain and type(value) is str:
+                result[name] = value
+            else:
+                result[name] = convert(value)
+        return result
+
+
+async def iter_documents(
+    query: FindMany, serializer: DocumentSerializer
+) -> AsyncGenerator[dict, None]:
+    """
+    跳过 Beanie 和 pydantic 直接读取原始文档，按 serializer 转换后返回
+    """
+    cursor = query.document_model.get_motor_collection().find(
+        query.get_filter_query(),
+        serializer.projection,
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+    async for doc in cursor:
+        yield serializer(doc)
+
+
+async def stream_jsonl(
+    query: FindMany,
+    serializer: DocumentSerializer,
+    transform: Callable[[dict], None] | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    用 orjson 将文档序列化为 jsonl，transform 可以在序列化前补充导出字段
+    """
+    buffer = bytearray()
+    async for item in iter_documents(query, serializer):
+        if transform is not None:
+            transform(item)
+        buffer += orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)
+        if len(buffer) >= EXPORT_FLUSH_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,402 @@
+import asyncio
+import hashlib
+import time
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncGenerator, Callable
+from uuid import UUID, uuid4
+
+import orjson
+from loguru import logger
+
+from app import crud, models, schemas
+from app.client.minio import minio
+from app.core import exceptions
+from app.db.session import redis_session
+from app.util import export, parquet, progress
+
+# 导出任务队列
+EXPORT_QUEUE = "export:queue"
+# 执行中的导出任务
+EXPORT_PROCESSING = "export:processing"
+# 导出任务及导出结果的保留时间（秒）
+EXPORT_JOB_TTL = 24 * 60 * 60
+# 导出任务超过该时间（秒）没有进度更新视为执行进程已退出，重新排队
+EXPORT_STALE_SECONDS = 5 * 60
+# 导出进度更新间隔（秒）
+EXPORT_PROGRESS_INTERVAL = 2
+# 等待导出任务的超时时间（秒）
+EXPORT_POP_TIMEOUT = 5
+# 下载地址有效期
+EXPORT_URL_EXPIRES = timedelta(hours=12)
+
+
+def job_key(job_id: UUID | str) -> str:
+    return f"export:job:{job_id}"
+
+
+def artifact_key(fingerprint: str) -> str:
+    return f"export:artifact:{fingerprint}"
+
+
+def data_status(
+    submit: schemas.operator.task.SubmitStatus | None,
+    qualified: schemas.operator.task.QualifiedStatus | None,
+) -> list[schemas.data.DataStatus] | None:
+    """
+    根据提交状态和合格状态计算需要导出的数据状态
+    """
+    status = None
+    if submit is not None:
+        if submit == schemas.operator.task.SubmitStatus.SUBMITTED:
+            status = [
+                schemas.data.DataStatus.COMPLETED,
+                schemas.data.DataStatus.DISCARDED,
+            ]
+        elif submit == schemas.operator.task.SubmitStatus.UN_SUBMITTED:
+            status = [
+                schemas.data.DataStatus.PENDING,
+                schemas.data.DataStatus.PROCESSING,
+            ]
+
+    if qualified is not None:
+        if qualified == schemas.operator.task.QualifiedStatus.COMPLETED:
+            if status is None:
+                status = [schemas.data.DataStatus.COMPLETED]
+            else:
+                status = list(set(status) & {schemas.data.DataStatus.COMPLETED})
+        elif qualified == schemas.operator.task.QualifiedStatus.DISCARDED:
+            if status is None:
+                status = [schemas.data.DataStatus.DISCARDED]
+            else:
+                status = list(set(status) & {schemas.data.DataStatus.DISCARDED})
+
+    return status
+
+
+async def load_tasks(task_ids: list[UUID]) -> list[models.label_task.LabelTask]:
+    """
+    按请求顺序返回存在的任务
+    """
+    tasks = await crud.label_task.query(task_id=task_ids).to_list()
+    task_h = {task.task_id: task for task in tasks}
+    return [task_h[task_id] for task_id in dict.fromkeys(task_ids) if task_id in task_h]
+
+
+async def load_user_names() -> defaultdict[str, str]:
+    user_name_map: defaultdict[str, str] = defaultdict(str)
+    async for user in crud.user.query():
+        user_name_map[user.user_id] = user.name
+    return user_name_map
+
+
+def _query(req: schemas.operator.task.ReqCreateExportJob, task_id: UUID | list[UUID]):
+    if req.kind == schemas.operator.task.ExportKind.RECORD:
+        return crud.record.query(task_id=task_id, is_submit=True)
+    return crud.data.query(
+        task_id=task_id,
+        status=data_status(req.submit, req.qualified),
+        invalid=req.invalid,
+    )
+
+
+def task_stream(
+    req: schemas.operator.task.ReqCreateExportJob,
+    task: models.label_task.LabelTask,
+    user_names: defaultdict[str, str] | None = None,
+    on_item: Callable[[dict], None] | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    导出单个任务的数据或标注记录
+    """
+    query = _query(req, task.task_id)
+    if req.kind == schemas.operator.task.ExportKind.RECORD:
+        serializer = export.DocumentSerializer(schemas.record.DoRecord)
+        schema_builder = parquet.record_schema
+    else:
+        serializer = export.DocumentSerializer(schemas.data.DoData)
+        schema_builder = parquet.data_schema
+
+    def transform(item: dict) -> None:
+        if user_names is not None:
+            item["creator"] = user_names[item["creator_id"]]
+        if on_item is not None:
+            on_item(item)
+
+    if req.export_format == schemas.operator.task.ExportFormat.PARQUET:
+        return parquet.stream_parquet(
+            query, serializer, schema_builder, task.tool_config, transform
+        )
+    return export.stream_jsonl(query, serializer, transform)
+
+
+def export_filename(
+    req: schemas.operator.task.ReqCreateExportJob,
+    tasks: list[models.label_task.LabelTask],
+) -> str:
+    if len(tasks) == 1:
+        return f"{tasks[0].title}.{req.export_format}"
+    return (
+        f"{datetime.now(tz=timezone(timedelta(hours=8))).strftime('%Y%m%d%H%M%S')}.zip"
+    )
+
+
+def export_content(
+    req: schemas.operator.task.ReqCreateExportJob,
+    tasks: list[models.label_task.LabelTask],
+    user_names: defaultdict[str, str] | None = None,
+    on_item: Callable[[dict], None] | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    单个任务直接导出，多个任务打包为 zip
+    """
+    if len(tasks) == 1:
+        return task_stream(req, tasks[0], user_names, on_item)
+
+    async def zip_entries() -> AsyncGenerator:
+        titles = export.unique_titles([task.title for task in tasks])
+        for task, title in zip(tasks, titles):
+            yield f"{title}.{req.export_format}", task_stream(
+                req, task, user_names, on_item
+            )
+
+    return export.stream_zip(zip_entries())
+
+
+async def job_fingerprint(
+    req: schemas.operator.task.ReqCreateExportJob,
+    tasks: list[models.label_task.LabelTask],
+) -> str:
+    """
+    相同的导出请求在任务数据没有变化时复用导出结果
+    """
+    task_ids = [task.task_id for task in tasks]
+    # 没有进度计数的任务先重新统计，之后的数据变化才会更新版本号
+    await progress.get_progress(task_ids)
+    progresses = await crud.task_progress.query(task_id=task_ids).to_list()
+    versions = {item.task_id: item.version for item in progresses}
+    content = orjson.dumps(
+        {
+            "request": req.model_dump(mode="json"),
+            "tasks": [
+                [
+                    str(task.task_id),
+                    task.title,
+                    task.tool_config,
+                    versions.get(task.task_id),
+                ]
+                for task in tasks
+            ],
+        },
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.sha256(content).hexdigest()
+
+
+async def get_job(job_id: UUID | str) -> schemas.operator.task.RespExportJob | None:
+    job = await redis_session.hgetall(job_key(job_id))
+    if not job:
+        return None
+    job = {k.decode("utf-8"): v.decode("utf-8") for k, v in job.items()}
+
+    url = None
+    if job["status"] == schemas.operator.task.ExportJobStatus.COMPLETED:
+        # 预签名地址直接访问对象存储，支持 Range 断点续传
+        url = minio.public_presigned_get_object(
+            job["path"],
+            expires=EXPORT_URL_EXPIRES,
+            response_headers={
+                "response-content-disposition": "attachment; filename*=UTF-8''"
+                + urllib.parse.quote(job["filename"])
+            },
+        )
+
+    return schemas.operator.task.RespExportJob(
+        job_id=job["job_id"],
+        status=job["status"],
+        processed=int(job.get("processed", 0)),
+        total=int(job.get("total", 0)),
+        filename=job.get("filename"),
+        url=url,
+        error=job.get("error"),
+        create_time=int(job["create_time"]),
+        update_time=int(job["update_time"]),
+    )
+
+
+async def create_job(
+    req: schemas.operator.task.ReqCreateExportJob,
+) -> schemas.operator.task.RespExportJob:
+    """
+    创建导出任务，相同请求已有未失败的任务时直接返回
+    """
+    tasks = await load_tasks(req.task_id)
+    if not tasks:
+        raise exceptions.TASK_NOT_EXIST
+    if req.export_format == schemas.operator.task.ExportFormat.PARQUET:
+        parquet.ensure_available()
+
+    fingerprint = await job_fingerprint(req, tasks)
+    existed_job_id = await redis_session.get(artifact_key(fingerprint))
+    if existed_job_id:
+        job = await get_job(existed_job_id.decode("utf-8"))
+        if job and job.status != schemas.operator.task.ExportJobStatus.FAILED:
+            return job
+
+    job_id = uuid4()
+    now = int(time.time())
+    async with redis_session.pipeline(transaction=True) as pipe:
+        pipe.hset(
+            job_key(job_id),
+            mapping={
+                "job_id": str(job_id),
+                "status": schemas.operator.task.ExportJobStatus.PENDING,
+                "request": req.model_dump_json(),
+                "fingerprint": fingerprint,
+                "filename": export_filename(req, tasks),
+                "processed": 0,
+                "total": 0,
+                "create_time": now,
+                "update_time": now,
+            },
+        )
+        pipe.expire(job_key(job_id), EXPORT_JOB_TTL)
+        pipe.set(artifact_key(fingerprint), str(job_id), ex=EXPORT_JOB_TTL)
+        pipe.lpush(EXPORT_QUEUE, str(job_id))
+        await pipe.execute()
+
+    return await get_job(job_id)  # type: ignore
+
+
+async def _update_job(job_id: str, **fields) -> None:
+    await redis_session.hset(
+        job_key(job_id), mapping={**fields, "update_time": int(time.time())}
+    )
+
+
+async def run_job(job_id: str) -> None:
+    """
+    执行导出任务，结果边生成边分片上传到对象存储
+    """
+    job = await redis_session.hgetall(job_key(job_id))
+    if not job:
+        return
+    req = schemas.operator.task.ReqCreateExportJob.model_validate_json(job[b"request"])
+    filename = job[b"filename"].decode("utf-8")
+
+    tasks = await load_tasks(req.task_id)
+    if not tasks:
+        await _update_job(
+            job_id,
+            status=schemas.operator.task.ExportJobStatus.FAILED,
+            error="Task not exist",
+        )
+        return
+
+    total = await _query(req, [task.task_id for task in tasks]).count()
+    await _update_job(
+        job_id, status=schemas.operator.task.ExportJobStatus.RUNNING, total=total
+    )
+
+    user_names = None
+    if req.kind == schemas.operator.task.ExportKind.RECORD:
+        user_names = await load_user_names()
+
+    processed = 0
+    last_report = time.monotonic()
+
+    def on_item(_: dict) -> None:
+        nonlocal processed
+        processed += 1
+
+    async def report(
+        chunks: AsyncGenerator[bytes, None],
+    ) -> AsyncGenerator[bytes, None]:
+        nonlocal last_report
+        async for chunk in chunks:
+            yield chunk
+            if time.monotonic() - last_report >= EXPORT_PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                await _update_job(job_id, processed=processed)
+
+    path = f"export/{job_id}/{filename}"
+    await minio.put_stream(
+        path,
+        report(export_content(req, tasks, user_names, on_item)),
+        content_type=(
+            "application/zip"
+            if filename.endswith(".zip")
+            else "application/octet-stream"
+        ),
+    )
+
+    await _update_job(
+        job_id,
+        status=schemas.operator.task.ExportJobStatus.COMPLETED,
+        processed=processed,
+        path=path,
+    )
+    # 导出结果从完成时开始计算保留时间
+    async with redis_session.pipeline(transaction=True) as pipe:
+        pipe.expire(job_key(job_id), EXPORT_JOB_TTL)
+        pipe.set(
+            artifact_key(job[b"fingerprint"].decode("utf-8")), job_id, ex=EXPORT_JOB_TTL
+        )
+        await pipe.execute()
+
+
+async def requeue_stale_jobs() -> None:
+    """
+    执行进程退出后遗留的导出任务重新排队
+    """
+    now = int(time.time())
+    for job_id in await redis_session.lrange(EXPORT_PROCESSING, 0, -1):
+        update_time = await redis_session.hget(
+            job_key(job_id.decode("utf-8")), "update_time"
+        )
+        if update_time is not None and now - int(update_time) < EXPORT_STALE_SECONDS:
+            continue
+        # 多个进程同时检查时只有一个能移除成功
+        if not await redis_session.lrem(EXPORT_PROCESSING, 1, job_id):
+            continue
+        if update_time is None:
+            continue
+        logger.warning(f"Requeue stale export job {job_id.decode('utf-8')}")
+        await _update_job(
+            job_id.decode("utf-8"), status=schemas.operator.task.ExportJobStatus.PENDING
+        )
+        await redis_session.lpush(EXPORT_QUEUE, job_id)
+
+
+async def run_export_worker() -> None:
+    """
+    循环执行导出任务，由 worker 进程启动
+    """
+    while True:
+        try:
+            job_id = await redis_session.brpoplpush(
+                EXPORT_QUEUE, EXPORT_PROCESSING, timeout=EXPORT_POP_TIMEOUT
+            )
+            if job_id is None:
+                await requeue_stale_jobs()
+                continue
+
+            logger.info(f"Run export job {job_id.decode('utf-8')}")
+            try:
+                await run_job(job_id.decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Export job {job_id.decode('utf-8')} failed")
+                await _update_job(
+                    job_id.decode("utf-8"),
+                    status=schemas.operator.task.ExportJobStatus.FAILED,
+                    error=str(e),
+                )
+            await redis_session.lrem(EXPORT_PROCESSING, 1, job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Export worker error: {e}")
+            await asyncio.sleep(1)
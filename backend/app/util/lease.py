@@ -0,0 +1,46 @@
+from beanie import PydanticObjectId
+
+from app.db.session import redis_session
+
+# 租约索引：记录id -> 过期时间
+LEASE_KEY = "task:lease"
+
+# 原子地弹出已到期的租约
+# ARGV: 当前时间, 最多弹出数量
+_pop_due_leases_script = redis_session.register_script(
+    """
+local members = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+if #members > 0 then
+    redis.call("ZREM", KEYS[1], unpack(members))
+end
+return members
+"""
+)
+
+
+async def add_leases(records: list, expire_time: int) -> None:
+    """
+    为新领取的记录写入租约，到期时间为记录创建时间加上任务答题限制时间
+    """
+    if not records:
+        return
+
+    await redis_session.zadd(
+        LEASE_KEY,
+        {str(record.id): record.create_time + expire_time for record in records},
+    )
+
+
+async def remove_leases(records: list) -> None:
+    if not records:
+        return
+
+    await redis_session.zrem(LEASE_KEY, *[str(record.id) for record in records])
+
+
+async def pop_due_leases(now: int, limit: int) -> list[PydanticObjectId]:
+    """
+    弹出最多 limit 个已到期的租约，返回对应的记录id
+    """
+    members = await _pop_due_leases_script(keys=[LEASE_KEY], args=[now, limit])
+    return [PydanticObjectId(member.decode("utf-8")) for member in members]
@@ -0,0 +1,209 @@
+from typing import Any, AsyncGenerator, Callable, NamedTuple
+
+import orjson
+from beanie.odm.queries.find import FindMany
+from starlette.concurrency import run_in_threadpool
+
+from app.core import exceptions
+from app.schemas.operator.stats import (
+    ANSWER_SCOPE,
+    CHOICE_KIND,
+    MESSAGE_QUESTION_FIELD_NAME,
+)
+from app.util import export
+from app.util.stats import MESSAGE_TYPE, QUESTION_TYPE, extract_choice_config
+
+# 每个 row group 的行数
+PARQUET_ROW_GROUP_SIZE = 10000
+# 压缩算法
+PARQUET_COMPRESSION = "zstd"
+
+
+class QuestionColumn(NamedTuple):
+    """
+    tool_config 中每个选择题展开后的列
+    """
+
+    name: str
+    scope: ANSWER_SCOPE
+    value: str
+    kind: CHOICE_KIND
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise exceptions.EXPORT_FORMAT_NOT_SUPPORTED
+    return pyarrow, pyarrow.parquet
+
+
+def ensure_available() -> None:
+    """
+    pyarrow 是可选依赖，未安装时不支持 parquet 导出
+    """
+    _import_pyarrow()
+
+
+def question_columns(tool_config: dict) -> list[QuestionColumn]:
+    columns = []
+    for scope in ANSWER_SCOPE:
+        for v in extract_choice_config(tool_config, scope):
+            if not v.get("value"):
+                continue
+            columns.append(
+                QuestionColumn(
+                    name=f"{scope}__{v['value']}",
+                    scope=scope,
+                    value=v["value"],
+                    kind=v["type"],
+                )
+            )
+    return columns
+
+
+def _dumps(value: Any) -> str | None:
+    if value is None:
+        return None
+    return orjson.dumps(value).decode("utf-8")
+
+
+def _answer(value: Any, kind: CHOICE_KIND) -> Any:
+    if value is None:
+        return None
+    if kind == CHOICE_KIND.ARRAY:
+        if not isinstance(value, list):
+            value = [value]
+        return [str(v) for v in value]
+    return str(value)
+
+
+def _question_values(evaluation: dict | None, column: QuestionColumn) -> Any:
+    """
+    会话题取单个答案，消息题和提问题按消息顺序取答案列表
+    """
+    evaluation = evaluation or {}
+    if column.scope == ANSWER_SCOPE.CONVERSATION:
+        answers = evaluation.get("conversation_evaluation") or {}
+        return _answer(answers.get(column.value), column.kind)
+
+    message_type = (
+        MESSAGE_TYPE if column.scope == ANSWER_SCOPE.MESSAGE else QUESTION_TYPE
+    )
+    values = []
+    for answers in (evaluation.get("message_evaluation") or {}).values():
+        if not isinstance(answers, dict):
+            continue
+        if answers.get(MESSAGE_QUESTION_FIELD_NAME) != message_type:
+            continue
+        values.append(_answer(answers.get(column.value), column.kind))
+    return values
+
+
+def _question_fields(pa, columns: list[QuestionColumn]) -> list:
+    fields = []
+    for column in columns:
+        value_type = pa.string()
+        if column.kind == CHOICE_KIND.ARRAY:
+            value_type = pa.list_(pa.string())
+        if column.scope != ANSWER_SCOPE.CONVERSATION:
+            value_type = pa.list_(value_type)
+        fields.append(pa.field(column.name, value_type))
+    return fields
+
+
+def data_schema(pa, columns: list[QuestionColumn]):
+    message = pa.struct(
+        [
+            ("message_id", pa.string()),
+            ("parent_id", pa.string()),
+            ("message_type", pa.string()),
+            ("content", pa.string()),
+            ("user_id", pa.string()),
+        ]
+    )
+    return pa.schema(
+        [
+            ("data_id", pa.string()),
+            ("questionnaire_id", pa.string()),
+            ("source_data_id", pa.string()),
+            ("result_id", pa.string()),
+            ("status", pa.string()),
+            ("prompt", pa.string()),
+            ("conversation_id", pa.string()),
+            ("conversation", pa.list_(message)),
+            ("reference_evaluation", pa.string()),
+            ("evaluation", pa.string()),
+            ("custom", pa.map_(pa.string(), pa.string())),
+            *_question_fields(pa, columns),
+        ]
+    )
+
+
+def record_schema(pa, columns: list[QuestionColumn]):
+    return pa.schema(
+        [
+            ("data_id", pa.string()),
+            ("questionnaire_id", pa.string()),
+            ("flow_index", pa.int64()),
+            ("creator_id", pa.string()),
+            ("creator", pa.string()),
+            ("create_time", pa.int64()),
+            ("submit_time", pa.int64()),
+            ("status", pa.string()),
+            ("evaluation", pa.string()),
+            *_question_fields(pa, columns),
+        ]
+    )
+
+
+def _to_row(item: dict, columns: list[QuestionColumn]) -> dict:
+    evaluation = item.get("evaluation")
+    row = dict(item)
+    for column in columns:
+        row[column.name] = _question_values(evaluation, column)
+    # 结构不固定的评价以 json 字符串保存，自定义数据的值以 json 字符串保存
+    row["evaluation"] = _dumps(evaluation)
+    if "reference_evaluation" in row:
+        row["reference_evaluation"] = _dumps(row["reference_evaluation"])
+    if "custom" in row:
+        row["custom"] = [(k, _dumps(v)) for k, v in (row["custom"] or {}).items()]
+    return row
+
+
+async def stream_parquet(
+    query: FindMany,
+    serializer: export.DocumentSerializer,
+    schema_builder: Callable,
+    tool_config: dict,
+    transform: Callable[[dict], None] | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    边读取游标边按 row group 写入 parquet，内存占用只与 row group 大小有关
+    """
+    pa, pq = _import_pyarrow()
+    columns = question_columns(tool_config)
+    schema = schema_builder(pa, columns)
+    buffer = export.StreamBuffer()
+    writer = pq.ParquetWriter(buffer, schema, compression=PARQUET_COMPRESSION)
+
+    def write(rows: list[dict]) -> None:
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+    rows = []
+    async for item in export.iter_documents(query, serializer):
+        if transform is not None:
+            transform(item)
+        rows.append(_to_row(item, columns))
+        if len(rows) >= PARQUET_ROW_GROUP_SIZE:
+            await run_in_threadpool(write, rows)
+            rows = []
+            if buffer.size:
+                yield buffer.pop()
+
+    if rows:
+        await run_in_threadpool(write, rows)
+    # 写入 footer
+    await run_in_threadpool(writer.close)
+    yield buffer.pop()
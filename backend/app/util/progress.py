@@ -0,0 +1,134 @@
+from uuid import UUID
+
+from app import crud, models, schemas
+
+# 数据状态对应的计数字段
+STATUS_FIELD = {
+    schemas.data.DataStatus.PENDING: "pending",
+    schemas.data.DataStatus.PROCESSING: "labeling",
+    schemas.data.DataStatus.COMPLETED: "completed",
+    schemas.data.DataStatus.DISCARDED: "discarded",
+}
+
+
+def _count_status(status: schemas.data.DataStatus) -> dict:
+    return {"$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}}
+
+
+async def init_progress(task_id: UUID) -> None:
+    await crud.task_progress.upsert(
+        obj_in=models.task_progress.TaskProgressCreate(task_id=task_id)
+    )
+
+
+async def remove_progress(task_id: UUID) -> None:
+    await crud.task_progress.query(task_id=task_id).delete()
+
+
+async def add_datas(task_id: UUID, datas: list) -> None:
+    """
+    新建数据后更新计数，打回后重新创建的数据不计入总题数
+    """
+    await crud.task_progress.inc(
+        task_id=task_id,
+        counts={
+            "total": len([data for data in datas if data.source_data_id is None]),
+            "pending": len(datas),
+        },
+    )
+
+
+async def move(
+    task_id: UUID,
+    from_status: schemas.data.DataStatus,
+    to_status: schemas.data.DataStatus,
+    count: int = 1,
+) -> None:
+    """
+    数据状态转换后更新计数
+    """
+    if from_status == to_status or count == 0:
+        return
+
+    await crud.task_progress.inc(
+        task_id=task_id,
+        counts={STATUS_FIELD[from_status]: -count, STATUS_FIELD[to_status]: count},
+    )
+
+
+async def touch(task_id: UUID) -> None:
+    """
+    数据或记录内容变化后更新版本号（如重复提交、打回已作废的数据），使导出结果失效
+    """
+    await crud.task_progress.touch(task_id=task_id)
+
+
+async def rebuild_progress(
+    task_ids: list[UUID],
+) -> dict[UUID, models.task_progress.TaskProgressCreate]:
+    """
+    根据数据重新统计任务进度计数
+    """
+    if not task_ids:
+        return {}
+
+    data_count = (
+        await crud.data.query(task_id=task_ids)
+        .aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": "$task_id",
+                        "total": {
+                            "$sum": {
+                                "$cond": [{"$in": ["$source_data_id", [None]]}, 1, 0]
+                            }
+                        },
+                        **{
+                            field: _count_status(status)
+                            for status, field in STATUS_FIELD.items()
+                        },
+                    }
+                },
+                {"$addFields": {"task_id": "$_id"}},
+            ],
+            projection_model=models.task_progress.TaskProgressCreate,
+        )
+        .to_list()
+    )
+    progress_map = {item.task_id: item for item in data_count}
+
+    # 没有数据的任务计数为 0
+    for task_id in task_ids:
+        progress = progress_map.setdefault(
+            task_id, models.task_progress.TaskProgressCreate(task_id=task_id)
+        )
+        await crud.task_progress.upsert(obj_in=progress)
+
+    return progress_map
+
+
+async def get_progress(
+    task_ids: list[UUID],
+) -> dict[UUID, schemas.operator.task.LabelTaskProgress]:
+    """
+    读取任务进度计数，计数不存在时重新统计
+    """
+    progress_map = {
+        item.task_id: item async for item in crud.task_progress.query(task_id=task_ids)
+    }
+    missing_task_ids = [task_id for task_id in task_ids if task_id not in progress_map]
+    progress_map.update(await rebuild_progress(missing_task_ids))
+
+    return {
+        task_id: schemas.operator.task.LabelTaskProgress(
+            completed=item.total - item.pending - item.labeling,
+            total=item.total,
+            pending=item.pending,
+            labeling=item.labeling,
+            labeled=item.completed + item.discarded,
+            discarded=item.discarded,
+            label_time=0,
+        )
+        for task_id, item in progress_map.items()
+    }
@@ -0,0 +1,250 @@
+from typing import Any, Iterable, NamedTuple
+from uuid import UUID
+
+import numpy as np
+import orjson
+from beanie.odm.queries.find import FindMany
+from bson import Binary
+
+from app.schemas.operator.stats import (
+    ANSWER_SCOPE,
+    BOOL_OPERATOR,
+    CHOICE_KIND,
+    MESSAGE_QUESTION_FIELD_NAME,
+    FilterAnswerOption,
+)
+from app.util.stats import MESSAGE_TYPE, QUESTION_TYPE
+
+# 每批读取的文档数量
+FILTER_BATCH_SIZE = 1000
+# 条件的第一个答案为该值时表示所有副本答案一致，否则表示存在不一致
+EQUAL_PREDICATE = "equal"
+# 单选题未作答时的答案
+ENUM_EMPTY_ANSWER = "__default_empty_answer"
+# 多选题答案排序后用该分隔符拼接
+ARRAY_ANSWER_SEPARATOR = "#@#"
+# 没有对应类型的消息时按一条空评价处理
+PLACEHOLDER_EVALUATION = {"__default_bottom_placeholder": "__default_bottom_placeholder"}
+
+
+class FilteredQuestionnaire(NamedTuple):
+    """
+    满足筛选条件的问卷及其所有副本
+    """
+
+    questionnaire_id: UUID
+    data_ids: list[UUID]
+    custom_ids: list[Any]
+
+
+class QuestionnaireColumns:
+    """
+    按问卷分组的列式数据，每条数据一行，每个筛选条件的答案编码为整数
+    """
+
+    def __init__(self, filters: list[FilterAnswerOption]) -> None:
+        self.filters = filters
+        self.questionnaire_ids: list[UUID] = []
+        self.data_ids: list[UUID] = []
+        self.custom_ids: list[Any] = []
+        # 每行数据所属问卷的下标
+        self.group = np.zeros(0, dtype=np.int64)
+        # 每行数据是否标记为无效问卷
+        self.invalid = np.zeros(0, dtype=bool)
+        # 每个筛选条件的 (数据行, 答案编码)，同一行的相同答案只出现一次
+        self.answers: list[tuple[np.ndarray, np.ndarray]] = []
+
+        self._questionnaire_of_row: list[UUID] = []
+        self._invalid: list[bool] = []
+        self._codes: list[dict[Any, int]] = [{} for _ in filters]
+        self._rows: list[list[int]] = [[] for _ in filters]
+        self._answer_codes: list[list[int]] = [[] for _ in filters]
+
+    @property
+    def projection(self) -> dict[str, int]:
+        return {
+            "_id": 0,
+            "data_id": 1,
+            "questionnaire_id": 1,
+            "custom.id": 1,
+            "evaluation.conversation_evaluation": 1,
+            "evaluation.message_evaluation": 1,
+            "evaluation.questionnaire_evaluation.is_invalid_questionnaire": 1,
+        }
+
+    def append(self, doc: dict) -> None:
+        row = len(self.data_ids)
+        evaluation = doc.get("evaluation") or {}
+        questionnaire_evaluation = evaluation.get("questionnaire_evaluation") or {}
+
+        self.data_ids.append(_uuid(doc["data_id"]))
+        self._questionnaire_of_row.append(_uuid(doc["questionnaire_id"]))
+        self.custom_ids.append((doc.get("custom") or {}).get("id", ""))
+        self._invalid.append(
+            bool(questionnaire_evaluation.get("is_invalid_questionnaire", False))
+        )
+
+        for i, predicate in enumerate(self.filters):
+            codes = self._codes[i]
+            seen = set()
+            for answers in _scope_evaluations(evaluation, predicate.scope):
+                code = codes.setdefault(_answer_key(answers, predicate), len(codes))
+                if code in seen:
+                    continue
+                seen.add(code)
+                self._rows[i].append(row)
+                self._answer_codes[i].append(code)
+
+    def build(self) -> "QuestionnaireColumns":
+        # 问卷按 id 排序，与数据库中的排序一致
+        self.questionnaire_ids = sorted(set(self._questionnaire_of_row))
+        index = {v: i for i, v in enumerate(self.questionnaire_ids)}
+        self.group = np.fromiter(
+            (index[v] for v in self._questionnaire_of_row),
+            dtype=np.int64,
+            count=len(self._questionnaire_of_row),
+        )
+        self.invalid = np.array(self._invalid, dtype=bool)
+        self.answers = [
+            (np.array(rows, dtype=np.int64), np.array(codes, dtype=np.int64))
+            for rows, codes in zip(self._rows, self._answer_codes)
+        ]
+        self._questionnaire_of_row, self._invalid = [], []
+        self._codes, self._rows, self._answer_codes = [], [], []
+        return self
+
+    @classmethod
+    def from_documents(
+        cls, docs: Iterable[dict], filters: list[FilterAnswerOption]
+    ) -> "QuestionnaireColumns":
+        columns = cls(filters)
+        for doc in docs:
+            columns.append(doc)
+        return columns.build()
+
+
+def _uuid(value: Any) -> UUID:
+    if isinstance(value, Binary):
+        return value.as_uuid()
+    return value
+
+
+def _scope_evaluations(evaluation: dict, scope: ANSWER_SCOPE) -> list[dict]:
+    """
+    一条数据在某个范围内的评价，消息和提问按类型拆分，每条消息一个
+    """
+    if scope == ANSWER_SCOPE.CONVERSATION:
+        return [evaluation.get("conversation_evaluation") or {}]
+
+    message_type = MESSAGE_TYPE if scope == ANSWER_SCOPE.MESSAGE else QUESTION_TYPE
+    ret = [
+        answers
+        for answers in (evaluation.get("message_evaluation") or {}).values()
+        if isinstance(answers, dict)
+        and answers.get(MESSAGE_QUESTION_FIELD_NAME) == message_type
+    ]
+    return ret or [PLACEHOLDER_EVALUATION]
+
+
+def _answer_key(answers: dict, predicate: FilterAnswerOption) -> Any:
+    """
+    多选题按排序后的选项比较，单选题按答案本身比较
+    """
+    if predicate.type == CHOICE_KIND.ARRAY:
+        value = answers.get(predicate.question, [""])
+        if isinstance(value, (list, str)) and all(isinstance(v, str) for v in value):
+            return ARRAY_ANSWER_SEPARATOR.join(sorted(value))
+    else:
+        value = answers.get(predicate.question, ENUM_EMPTY_ANSWER)
+        if not isinstance(value, (list, dict)):
+            return value
+    # 结构不符合题型的答案按 json 比较
+    return (None, orjson.dumps(value, option=orjson.OPT_SORT_KEYS))
+
+
+async def load_questionnaire_columns(
+    query: FindMany, filters: list[FilterAnswerOption]
+) -> QuestionnaireColumns:
+    """
+    只读取筛选需要的评价字段，构建列式数据
+    """
+    columns = QuestionnaireColumns(filters)
+    cursor = query.document_model.get_motor_collection().find(
+        query.get_filter_query(),
+        columns.projection,
+        batch_size=FILTER_BATCH_SIZE,
+    )
+    async for doc in cursor:
+        columns.append(doc)
+    return columns.build()
+
+
+def match_questionnaire(
+    operator: BOOL_OPERATOR,
+    filters: list[FilterAnswerOption],
+    columns: QuestionnaireColumns,
+) -> np.ndarray:
+    """
+    返回满足条件的问卷下标，每个条件判断所有副本是否存在一致的答案：
+    某个答案的副本数等于问卷的副本数即为一致
+    """
+    group_count = len(columns.questionnaire_ids)
+    data_count = np.bincount(columns.group, minlength=group_count)
+    invalid_count = np.bincount(
+        columns.group[columns.invalid], minlength=group_count
+    )
+    all_invalid = invalid_count == data_count
+
+    if operator == BOOL_OPERATOR.OP_AND:
+        matched = np.ones(group_count, dtype=bool)
+    else:
+        matched = np.zeros(group_count, dtype=bool)
+
+    for predicate, (rows, codes) in zip(filters, columns.answers):
+        code_count = int(codes.max()) + 1 if codes.size else 1
+        keys, votes = np.unique(
+            columns.group[rows] * code_count + codes, return_counts=True
+        )
+        key_groups = keys // code_count
+        agreed = votes == data_count[key_groups]
+
+        flags = np.zeros(group_count, dtype=bool)
+        if predicate.answer[:1] == [EQUAL_PREDICATE]:
+            flags[key_groups[agreed]] = True
+            flags |= all_invalid
+        else:
+            flags[key_groups[~agreed]] = True
+
+        if operator == BOOL_OPERATOR.OP_AND:
+            matched &= flags
+        else:
+            matched |= flags
+
+    # 只有一个副本的问卷无法比较
+    matched &= data_count >= 2
+    return np.flatnonzero(matched)
+
+
+def filter_questionnaire(
+    operator: BOOL_OPERATOR,
+    filters: list[FilterAnswerOption],
+    columns: QuestionnaireColumns,
+) -> list[FilteredQuestionnaire]:
+    matched = match_questionnaire(operator, filters, columns)
+    if matched.size == 0:
+        return []
+
+    # 按问卷排序数据行，取出每个问卷的副本
+    order = np.argsort(columns.group, kind="stable")
+    bounds = np.searchsorted(columns.group[order], [matched, matched + 1])
+    ret: list[FilteredQuestionnaire] = []
+    for index, start, end in zip(matched.tolist(), *bounds.tolist()):
+        rows = order[start:end].tolist()
+        ret.append(
+            FilteredQuestionnaire(
+                questionnaire_id=columns.questionnaire_ids[index],
+                data_ids=[columns.data_ids[row] for row in rows],
+                custom_ids=[columns.custom_ids[row] for row in rows],
+            )
+        )
+    return ret
@@ -1,12 +1,7 @@
 from typing import Any
-from uuid import UUID
 
-from pydantic import BaseModel, Field
-
-from app import models, schemas
-from app.schemas.evaluation import QuestionnaireEvaluation
+from app.schemas.evaluation import EvaluationIndex, LabelEvaluation
 from app.schemas.operator.stats import (
-    ANSWER_FLITER_KIND,
     ANSWER_SCOPE,
     BOOL_OPERATOR,
     CHOICE_KIND,
@@ -18,40 +13,6 @@ MESSAGE_TYPE = "receive"
 QUESTION_TYPE = "send"
 
 
-class Evaluation(BaseModel):
-    # 针对单条消息的评价
-    message_evaluation: dict | None = Field(
-        description="针对单条消息的评价", default=None
-    )
-
-    # 针对单个提问的评价
-    question_evaluation: dict | None = Field(
-        description="针对单条消息的评价", default=None
-    )
-
-    # 针对整个对话的评价
-    conversation_evaluation: dict | None = Field(
-        description="针对整个对话的评价", default=None
-    )
-
-    # 针对整个问卷的评价
-    questionnaire_evaluation: QuestionnaireEvaluation | None = Field(
-        description="针对整个问卷的评价", default=None
-    )
-
-
-class ExportFilterLabelTaskProjectModel(BaseModel):
-    questionnaire_id: UUID = Field(alias="_id")
-    evaluations: list[Evaluation] = Field(
-        description="join 查询出的 evaluation 记录",
-    )
-    datas: list[models.data.Data] = Field(description="数据库查询出的数据")
-
-
-class ExportFilterLabelIDWithoutDupProjectModel(BaseModel):
-    data: models.data.Data = Field(description="数据")
-
-
 def str_message_question_field_name(scope: ANSWER_SCOPE) -> str:
     if scope == ANSWER_SCOPE.MESSAGE:
         return MESSAGE_TYPE
@@ -94,416 +55,185 @@ def extract_choice_config(tool_config: dict, scope: ANSWER_SCOPE) -> list[dict]:
     return ret
 
 
-def build_format_message_evaluation():
+def _index_answer(value: Any) -> list[str] | None:
+    if value is None or isinstance(value, dict):
+        return None
+    if isinstance(value, list):
+        return [
+            str(v) for v in value if v is not None and not isinstance(v, (dict, list))
+        ]
+    return [str(value)]
+
+
+def build_evaluation_index(
+    evaluation: LabelEvaluation | None,
+) -> list[EvaluationIndex]:
+    """
+    将评价展开为 (范围, 问题, 答案) 列表，提交时写入数据，统计和筛选直接按索引匹配
+    """
+    if evaluation is None:
+        return []
+
+    answers_list: list[tuple[ANSWER_SCOPE, dict]] = [
+        (ANSWER_SCOPE.CONVERSATION, evaluation.conversation_evaluation or {})
+    ]
+    for answers in (evaluation.message_evaluation or {}).values():
+        if not isinstance(answers, dict):
+            continue
+        message_type = answers.get(MESSAGE_QUESTION_FIELD_NAME)
+        if message_type == MESSAGE_TYPE:
+            answers_list.append((ANSWER_SCOPE.MESSAGE, answers))
+        elif message_type == QUESTION_TYPE:
+            answers_list.append((ANSWER_SCOPE.QUESTION, answers))
+
+    ret: list[EvaluationIndex] = []
+    seen = set()
+    for scope, answers in answers_list:
+        for question, value in answers.items():
+            if question == MESSAGE_QUESTION_FIELD_NAME:
+                continue
+            answer = _index_answer(value)
+            if answer is None:
+                continue
+            # 多条消息的相同答案只保留一个
+            key = (scope, question, tuple(answer))
+            if key in seen:
+                continue
+            seen.add(key)
+            ret.append(EvaluationIndex(scope=scope, question=question, answer=answer))
+    return ret
+
+
+def match_evaluation_index(
+    scope: ANSWER_SCOPE, question: str, answer: Any = None
+) -> dict:
+    cond = {"scope": str(scope), "question": question}
+    if answer is not None:
+        cond["answer"] = answer
+    return {"evaluation_index": {"$elemMatch": cond}}
+
+
+def _choice_count_stages(
+    scope: ANSWER_SCOPE, kind: CHOICE_KIND, choice_name: str
+) -> list[dict]:
+    cond: dict[str, Any] = {
+        "evaluation_index.scope": str(scope),
+        "evaluation_index.question": choice_name,
+    }
+    if kind == CHOICE_KIND.ENUM:
+        cond["evaluation_index.answer"] = {"$size": 1}
     return [
-        {
-            "$addFields": {
-                "evaluation.message_evaluation": {
-                    "$ifNull": [
-                        "$evaluation.message_evaluation",
-                        {
-                            "__default_bottom_placeholder": {
-                                "__default_bottom_placeholder": "__default_bottom_placeholder"
-                            }
-                        },
-                    ]
-                }
-            }
-        },
-        {"$addFields": {"data": {"$objectToArray": "$evaluation.message_evaluation"}}},
-        {
-            "$addFields": {
-                "message_evaluation_stage1": {
-                    "$filter": {
-                        "input": "$data",
-                        "as": "item",
-                        "cond": {"$eq": ["$$item.v.__sys_message_type", MESSAGE_TYPE]},
-                    }
-                }
-            }
-        },
-        {
-            "$addFields": {
-                "message_evaluation_stage2": {
-                    "$map": {
-                        "input": "$message_evaluation_stage1",
-                        "as": "item",
-                        "in": "$$item.v",
-                    }
-                }
-            }
-        },
-        {
-            "$set": {
-                "message_evaluation_stage3": {
-                    "$cond": {
-                        "if": {"$gte": [{"$size": "$message_evaluation_stage2"}, 1]},
-                        "then": "$message_evaluation_stage2",
-                        "else": [
-                            {
-                                "__default_bottom_placeholder": "__default_bottom_placeholder"
-                            }
-                        ],
-                    }
-                }
-            }
-        },
-        {
-            "$addFields": {
-                "question_evaluation_stage1": {
-                    "$filter": {
-                        "input": "$data",
-                        "as": "item",
-                        "cond": {"$eq": ["$$item.v.__sys_message_type", QUESTION_TYPE]},
-                    }
-                }
-            }
-        },
-        {
-            "$addFields": {
-                "question_evaluation_stage2": {
-                    "$map": {
-                        "input": "$question_evaluation_stage1",
-                        "as": "item",
-                        "in": "$$item.v",
-                    }
-                }
-            }
-        },
-        {
-            "$set": {
-                "question_evaluation_stage3": {
-                    "$cond": {
-                        "if": {"$gte": [{"$size": "$question_evaluation_stage2"}, 1]},
-                        "then": "$question_evaluation_stage2",
-                        "else": [
-                            {
-                                "__default_bottom_placeholder": "__default_bottom_placeholder"
-                            }
-                        ],
-                    }
-                }
-            }
-        },
-        {"$unwind": {"path": "$message_evaluation_stage3"}},
-        {"$unwind": {"path": "$question_evaluation_stage3"}},
+        {"$match": cond},
+        {"$unwind": "$evaluation_index.answer"},
+        # 先按 (选项, 数据) 去重再计数，避免 $addToSet 收集全部数据 id
         {
             "$group": {
-                "_id": "$_id",
-                "data_id": {"$addToSet": "$data_id"},
-                "questionnaire_id": {"$addToSet": "$questionnaire_id"},
-                "message_evaluation": {"$addToSet": "$message_evaluation_stage3"},
-                "question_evaluation": {"$addToSet": "$question_evaluation_stage3"},
-                "evaluation": {"$addToSet": "$evaluation"},
-                "custom_id": {"$first": "$custom.id"},
-            }
-        },
-        {"$unwind": "$data_id"},
-        {"$unwind": "$questionnaire_id"},
-        {"$unwind": "$message_evaluation"},
-        {"$unwind": "$question_evaluation"},
-        {"$unwind": "$evaluation"},
-        {
-            "$addFields": {
-                "evaluation.message_evaluation": "$message_evaluation",
-                "evaluation.question_evaluation": "$question_evaluation",
-            },
-        },
-        {
-            "$project": {
-                "evaluation": 1,
-                "data_id": 1,
-                "questionnaire_id": 1,
-                "custom_id": 1,
+                "_id": {"value": "$evaluation_index.answer", "data_id": "$data_id"}
             }
         },
+        {"$group": {"_id": "$_id.value", "count": {"$sum": 1}}},
     ]
 
 
 def build_agg_choice_count(
     scope: ANSWER_SCOPE, kind: CHOICE_KIND, choice_name: str
 ) -> list[dict]:
-    scope_str = str_scope(scope)
+    return [
+        {"$match": match_evaluation_index(scope, choice_name)},
+        {"$project": {"data_id": 1, "evaluation_index": 1}},
+        {"$unwind": "$evaluation_index"},
+        *_choice_count_stages(scope, kind, choice_name),
+    ]
 
-    sql_arr = build_format_message_evaluation()
 
-    if kind == CHOICE_KIND.ENUM:
-        sql_arr.extend(
-            [
-                {
-                    "$group": {
-                        "_id": f"$evaluation.{scope_str}.{choice_name}",
-                        "data_ids": {"$addToSet": "$data_id"},
-                    }
-                },
-                {"$addFields": {"count": {"$size": "$data_ids"}}},
-                {"$project": {"_id": 1, "count": 1}},
-            ]
-        )
+def choice_facet_name(index: int) -> str:
+    return f"q{index}"
 
-    else:
-        sql_arr.extend(
-            [
-                {
-                    "$unwind": {
-                        "path": f"$evaluation.{scope_str}.{choice_name}",
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": f"$evaluation.{scope_str}.{choice_name}",
-                        "data_ids": {"$addToSet": "$data_id"},
-                    }
-                },
-                {"$addFields": {"count": {"$size": "$data_ids"}}},
-                {"$project": {"_id": 1, "count": 1}},
-            ]
-        )
-    return sql_arr
+
+def build_agg_choice_count_facet(
+    questions: list[tuple[ANSWER_SCOPE, CHOICE_KIND, str]],
+) -> list[dict]:
+    """
+    展开后的评价只 $unwind 一次，每个问题作为 $facet 的一个分支统计选项对应的数据数量，
+    结果为一个文档，第 i 个问题的统计在 choice_facet_name(i) 字段中
+    """
+    return [
+        {"$project": {"data_id": 1, "evaluation_index": 1}},
+        {"$unwind": "$evaluation_index"},
+        {
+            "$facet": {
+                choice_facet_name(index): _choice_count_stages(
+                    scope, kind, choice_name
+                )
+                for index, (scope, kind, choice_name) in enumerate(questions)
+            }
+        },
+    ]
 
 
 def build_download_stats_id(
     scope: ANSWER_SCOPE, kind: CHOICE_KIND, question_value: str, choice_value: str
 ) -> list[dict]:
-    scope_str = str_scope(scope)
-    sql_arr = build_format_message_evaluation()
-    if kind == CHOICE_KIND.ENUM:
-        sql_arr.extend(
-            [
-                {
-                    "$match": {
-                        f"evaluation.{scope_str}.{question_value}": choice_value,
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$data_id",
-                        "data_id": {"$addToSet": "$data_id"},
-                        "questionnaire_id": {"$addToSet": "$questionnaire_id"},
-                        "custom_id": {"$addToSet": "$custom_id"},
-                    }
-                },
-                {"$unwind": "$data_id"},
-                {"$unwind": "$questionnaire_id"},
-                {
-                    "$project": {
-                        "data_id": 1,
-                        "questionnaire_id": 1,
-                        "custom_id": 1,
-                    }
-                },
-                {"$sort": {"questionnaire_id": 1}},
-            ]
-        )
-    else:
-        sql_arr.extend(
-            [
-                {
-                    "$match": {
-                        f"evaluation.{scope_str}.{question_value}": {
-                            "$elemMatch": {
-                                "$eq": choice_value,
-                            }
-                        },
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$data_id",
-                        "data_id": {"$addToSet": "$data_id"},
-                        "questionnaire_id": {"$addToSet": "$questionnaire_id"},
-                        "custom_id": {"$addToSet": "$custom.id"},
-                    }
-                },
-                {"$unwind": "$data_id"},
-                {"$unwind": "$questionnaire_id"},
-                {
-                    "$project": {
-                        "data_id": 1,
-                        "questionnaire_id": 1,
-                        "custom_id": 1,
-                    }
-                },
-                {"$sort": {"questionnaire_id": 1}},
-            ]
-        )
-    return sql_arr
+    # 单选题和多选题都是答案列表中包含该选项
+    return [
+        {"$match": match_evaluation_index(scope, question_value, choice_value)},
+        {
+            "$project": {
+                "_id": 0,
+                "data_id": 1,
+                "questionnaire_id": 1,
+                "custom_id": ["$custom.id"],
+            }
+        },
+        {"$sort": {"questionnaire_id": 1}},
+    ]
 
 
 def build_filter_query(
-    kind: ANSWER_FLITER_KIND,
     bool_combinator: BOOL_OPERATOR,
     opts: list[FilterAnswerOption],
 ) -> list[dict[str, Any]]:
-
-    sql_arr = build_format_message_evaluation()
+    """
+    单题模式按展开后的评价筛选数据，源题模式见 questionnaire_filter
+    """
     op = "$and"
     if bool_combinator == BOOL_OPERATOR.OP_OR:
         op = "$or"
 
-    if kind == ANSWER_FLITER_KIND.WITHOUT_DUPLICATE:
-        sql_arr.extend(
-            [
-                {
-                    "$match": (
-                        {
-                            op: [
-                                (
-                                    {
-                                        f"evaluation.{str_scope(opt.scope)}.{opt.question}": "".join(
-                                            opt.answer
-                                        )
-                                    }
-                                    if opt.type == CHOICE_KIND.ENUM
-                                    else {
-                                        "$and": [
-                                            {
-                                                f"evaluation.{str_scope(opt.scope)}.{opt.question}": {
-                                                    "$all": [
-                                                        {"$elemMatch": {"$eq": answer}}
-                                                        for answer in opt.answer
-                                                    ]
-                                                }
-                                            },
-                                            {
-                                                f"evaluation.{str_scope(opt.scope)}.{opt.question}": {
-                                                    "$size": len(opt.answer)
-                                                }
-                                            },
-                                        ]
-                                    }
-                                )
-                                for opt in opts
-                            ]
-                        }
-                        if len(opts) > 0
-                        else {}
-                    )
-                },
-                {
-                    "$group": {
-                        "_id": "$data_id",
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "Data",
-                        "localField": "_id",
-                        "foreignField": "data_id",
-                        "as": "data",
-                    }
-                },
-                {"$unwind": {"path": "$data"}},
-                {"$project": {"data": 1}},
-                {"$sort": {"data.questionnaire_id": 1}},
-            ]
-        )
-    else:
-        sql_arr.extend(
-            [
-                {
-                    "$lookup": {
-                        "from": "Data",
-                        "localField": "data_id",
-                        "foreignField": "data_id",
-                        "as": "data",
-                    }
-                },
-                {"$unwind": {"path": "$data"}},
-                {
-                    "$project": {
-                        "questionnaire_id": 1,
-                        "evaluation": 1,
-                        "data": 1,
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$questionnaire_id",
-                        "evaluations": {"$push": "$evaluation"},
-                        "datas": {"$push": "$data"},
-                    }
-                },
-                {"$sort": {"_id": 1}},
-            ]
+    sql_arr: list[dict[str, Any]] = []
+    if len(opts) > 0:
+        sql_arr.append(
+            {
+                "$match": {
+                    op: [
+                        (
+                            match_evaluation_index(
+                                opt.scope, opt.question, "".join(opt.answer)
+                            )
+                            if opt.type == CHOICE_KIND.ENUM
+                            else match_evaluation_index(
+                                opt.scope,
+                                opt.question,
+                                {"$all": opt.answer, "$size": len(opt.answer)},
+                            )
+                        )
+                        for opt in opts
+                    ]
+                }
+            }
         )
-
-    return sql_arr
-
-
-def filter_questionnaire(
-    operator: BOOL_OPERATOR,
-    filters: list[FilterAnswerOption],
-    records: list[ExportFilterLabelTaskProjectModel],
-) -> list[ExportFilterLabelTaskProjectModel]:
-    validate_idx = []
-    for idx, v in enumerate(records):
-        flags = []
-        conversation_eval = [vv.conversation_evaluation or {} for vv in v.evaluations]
-        question_eval = [vv.question_evaluation or {} for vv in v.evaluations]
-        message_eval = [vv.message_evaluation or {} for vv in v.evaluations]
-        questionnaire_eval = [
-            vv.questionnaire_evaluation or None for vv in v.evaluations
+    # 只返回 id，完整数据由调用方按需读取
+    sql_arr.extend(
+        [
+            {
+                "$project": {
+                    "_id": 0,
+                    "data_id": 1,
+                    "questionnaire_id": 1,
+                    "custom_id": ["$custom.id"],
+                }
+            },
+            {"$sort": {"questionnaire_id": 1}},
         ]
-        data_ids = [str(vv.id) for vv in v.datas]
-        if 2 > len(set(data_ids)):
-            flags.append(False)
-            continue
-
-        for predicate in filters:
-            ans_by_group: dict[str, list] = {}
-            eval_arr = []
-            is_invalid_questionnaires: list[bool] = [
-                q.is_invalid_questionnaire if q is not None else False
-                for q in questionnaire_eval
-            ]
-            if predicate.scope == schemas.operator.stats.ANSWER_SCOPE.CONVERSATION:
-                eval_arr = conversation_eval
-            elif predicate.scope == schemas.operator.stats.ANSWER_SCOPE.MESSAGE:
-                eval_arr = message_eval
-            else:
-                eval_arr = question_eval
-
-            for i, d in enumerate(eval_arr or []):
-                if d is None:
-                    ans = "__default_skip_answer"
-                    if ans not in ans_by_group:
-                        ans_by_group[ans] = []
-                    ans_by_group[ans].append(data_ids[i])
-                elif predicate.type == schemas.operator.stats.CHOICE_KIND.ARRAY:
-                    ret_v = sorted(d.get(predicate.question, [""]))
-                    ans = "#@#".join(ret_v)
-                    if ans not in ans_by_group:
-                        ans_by_group[ans] = []
-                    ans_by_group[ans].append(data_ids[i])
-                else:
-                    ans = d.get(predicate.question, "__default_empty_answer")
-                    if ans not in ans_by_group:
-                        ans_by_group[ans] = []
-                    ans_by_group[ans].append(data_ids[i])
-            answer_with_votes = [
-                len(set(ans_by_group[key])) == len(set(data_ids))
-                for key in ans_by_group
-            ]
-
-            if predicate.answer[0] == "equal":  # 需要和前端制定
-                if any(answer_with_votes):
-                    flags.append(True)
-                else:
-                    flags.append(False or all(is_invalid_questionnaires))
-            else:
-                if all(answer_with_votes):
-                    flags.append(False)
-                else:
-                    flags.append(True)
-
-        if operator == schemas.operator.stats.BOOL_OPERATOR.OP_AND:
-            if len(flags) == 0 or all(flags):
-                validate_idx.append(idx)
-        else:
-            if len(flags) > 0 and any(flags):
-                validate_idx.append(idx)
-    ret: list[ExportFilterLabelTaskProjectModel] = []
-    for i in validate_idx:
-        ret.append(records[i])
-    return ret
+    )
+    return sql_arr
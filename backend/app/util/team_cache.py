@@ -0,0 +1,55 @@
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from app import crud
+from app.db.session import redis_session
+
+# 用户所属团队缓存的过期时间（秒）
+USER_TEAMS_EXPIRE = 24 * 60 * 60
+# 用户所属团队缓存已构建的标记
+USER_TEAMS_MARKER = "built"
+
+
+class ViewTeamID(BaseModel):
+    team_id: UUID
+
+
+def user_teams_key(user_id: str) -> str:
+    return f"user:teams:{user_id}"
+
+
+async def get_user_team_ids(user_id: str) -> set[UUID]:
+    """
+    获取用户所属的团队id，缓存不存在时从团队成员中构建
+    """
+    key = user_teams_key(user_id)
+    members = await redis_session.smembers(key)
+    if members:
+        return {
+            UUID(member.decode("utf-8"))
+            for member in members
+            if member.decode("utf-8") != USER_TEAMS_MARKER
+        }
+
+    team_ids = {
+        team.team_id
+        async for team in crud.team.query(user_id=user_id).project(ViewTeamID)
+    }
+
+    async with redis_session.pipeline(transaction=True) as pipe:
+        pipe.sadd(key, USER_TEAMS_MARKER, *[str(team_id) for team_id in team_ids])
+        pipe.expire(key, USER_TEAMS_EXPIRE)
+        await pipe.execute()
+
+    return team_ids
+
+
+async def invalidate_user_teams(user_ids: list[str]) -> None:
+    """
+    团队成员变更后使用户所属团队缓存失效
+    """
+    if not user_ids:
+        return
+
+    await redis_session.delete(*[user_teams_key(user_id) for user_id in user_ids])
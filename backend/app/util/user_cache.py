@@ -0,0 +1,74 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from loguru import logger
+
+from app import crud, models
+from app.db.session import redis_session
+
+# 用户缓存失效通知频道
+USER_INVALIDATE_CHANNEL = "user:invalidate"
+# 用户缓存有效期（秒）
+USER_CACHE_TTL = 60
+# 用户缓存最大数量
+USER_CACHE_SIZE = 10000
+
+# 用户名 -> (过期时间, 用户)
+_cache: OrderedDict[str, tuple[float, models.user.User]] = OrderedDict()
+
+
+async def get_user_by_name(name: str) -> models.user.User | None:
+    """
+    根据用户名获取用户，优先读取进程内缓存
+    """
+    item = _cache.get(name)
+    if item is not None:
+        expire_at, user = item
+        if expire_at > time.monotonic():
+            _cache.move_to_end(name)
+            return user.model_copy()
+        _cache.pop(name, None)
+
+    user = await crud.user.query(exact_name=name).first_or_none()
+    if user is None:
+        return None
+
+    _cache[name] = (time.monotonic() + USER_CACHE_TTL, user)
+    _cache.move_to_end(name)
+    while len(_cache) > USER_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    return user.model_copy()
+
+
+def evict_user(name: str) -> None:
+    _cache.pop(name, None)
+
+
+async def invalidate_user(name: str) -> None:
+    """
+    使所有进程中该用户的缓存失效
+    """
+    evict_user(name)
+    await redis_session.publish(USER_INVALIDATE_CHANNEL, name)
+
+
+async def listen_user_invalidation() -> None:
+    """
+    订阅用户缓存失效通知，断线后重连
+    """
+    while True:
+        try:
+            async with redis_session.pubsub() as pubsub:
+                await pubsub.subscribe(USER_INVALIDATE_CHANNEL)
+                # 重连期间可能错过通知，清空缓存
+                _cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        evict_user(message["data"].decode("utf-8"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"User invalidation listener error: {e}")
+            await asyncio.sleep(1)
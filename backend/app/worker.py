@@ -7,10 +7,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.db.init_db import close_db, init_db
 from app.scheduler.init_scheduler import scheduler
+from app.scheduler.task import add_scheduler_jobs
+from app.util.export_job import run_export_worker
+
+export_worker: asyncio.Task | None = None
 
 
 def shutdown():
     print("shutdown")
+    # 停止导出任务，未完成的任务会被重新排队
+    if export_worker is not None:
+        export_worker.cancel()
     # 关闭定时任务
     scheduler.shutdown(wait=True)
     # 关闭数据库
@@ -19,10 +26,14 @@ def shutdown():
 
 
 async def main():
+    global export_worker
     # 初始化数据库
     await init_db()
     # 初始化定时任务
     scheduler.start()
+    add_scheduler_jobs()
+    # 执行后台导出任务
+    export_worker = asyncio.create_task(run_export_worker())
 
 
 if __name__ == "__main__":
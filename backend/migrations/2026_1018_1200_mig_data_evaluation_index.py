@@ -0,0 +1,65 @@
+import sys
+
+sys.path.append('.')
+
+import asyncio
+
+from beanie import Document, init_beanie
+from pydantic import Field
+
+from app.core.config import settings
+from app.db.session import mongo_session, redis_session
+from app.schemas.data import DataStatus
+from app.schemas.evaluation import EvaluationIndex, LabelEvaluation
+from app.util.stats import build_evaluation_index
+
+
+"""
+为已完成的数据生成 evaluation_index（展开后的评价），统计和筛选依赖该字段
+根据 evaluation 重新生成，升级脚本具有幂等性质，可以多次运行
+升级完成前缓存的选项计数缺少未迁移的数据，最后删除所有选项计数，读取时重新统计
+"""
+
+
+class Data(Document):
+    # 数据状态
+    status: DataStatus
+
+    # 评价
+    evaluation: LabelEvaluation | None = Field(default=None)
+
+    # 展开后的评价
+    evaluation_index: list[EvaluationIndex] | None = Field(default=None)
+
+
+async def init_db():
+    await init_beanie(
+        database=mongo_session[settings.MongoDB_DB_NAME],
+        document_models=[Data],  # type: ignore
+    )
+
+    total = 0
+    async for data in Data.find(Data.status == DataStatus.COMPLETED):
+        await data.set({Data.evaluation_index: build_evaluation_index(data.evaluation)})
+        total += 1
+        if total % 1000 == 0:
+            print(f"updated {total}")
+    print(f"done, updated {total}")
+
+    keys = [key async for key in redis_session.scan_iter(match="stats:choice:*")]
+    if keys:
+        await redis_session.delete(*keys)
+    print(f"removed {len(keys)} choice stats")
+
+
+async def close_db():
+    mongo_session.close()
+    await redis_session.close()
+
+
+async def mig():
+    await init_db()
+    await close_db()
+
+if __name__ == '__main__':
+   asyncio.run(mig())
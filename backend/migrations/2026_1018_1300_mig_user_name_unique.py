@@ -0,0 +1,93 @@
+import sys
+
+sys.path.append('.')
+
+import asyncio
+from uuid import UUID
+
+from beanie import Document, init_beanie
+
+from app.core.config import settings
+from app.db.session import mongo_session
+
+
+"""
+User.name 增加了唯一索引，索引在服务启动（init_beanie）时创建，存在重名用户时创建失败，服务无法启动
+升级前运行本脚本检查重名用户：
+    python migrations/2026_1018_1300_mig_user_name_unique.py          只列出重名用户
+    python migrations/2026_1018_1300_mig_user_name_unique.py --fix    保留最早创建的用户，其余用户改名为 "名称_序号"
+改名后的用户需要使用新名称登录，团队成员列表中的名称同时更新
+升级脚本具有幂等性质，可以多次运行
+"""
+
+
+class User(Document):
+    # 用户id
+    user_id: str
+
+    # 用户名称
+    name: str
+
+    # 创建时间
+    create_time: int = 0
+
+
+class Team(Document):
+    # 团队id
+    team_id: UUID
+
+
+async def unused_name(name: str, index: int) -> tuple[str, int]:
+    while True:
+        new_name = f"{name}_{index}"
+        if not await User.find_one(User.name == new_name):
+            return new_name, index
+        index += 1
+
+
+async def init_db(fix: bool) -> int:
+    await init_beanie(
+        database=mongo_session[settings.MongoDB_DB_NAME],
+        document_models=[User, Team],  # type: ignore
+    )
+
+    duplicated = await User.aggregate(
+        [
+            {"$group": {"_id": "$name", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ],
+        allowDiskUse=True,
+    ).to_list()
+
+    for item in duplicated:
+        name = item["_id"]
+        users = await User.find(User.name == name).sort("create_time", "_id").to_list()
+        print(f"duplicated name {name!r}: {[user.user_id for user in users]}")
+        if not fix:
+            continue
+
+        index = 1
+        for user in users[1:]:
+            new_name, index = await unused_name(name, index)
+            await user.set({User.name: new_name})
+            await Team.find({"users.user_id": user.user_id}).update(
+                {"$set": {"users.$.name": new_name}}
+            )
+            print(f"  rename user {user.user_id}: {name!r} -> {new_name!r}")
+            index += 1
+
+    print(f"done, {len(duplicated)} duplicated names")
+    return 0 if fix or not duplicated else 1
+
+
+async def close_db():
+    mongo_session.close()
+
+
+async def mig() -> int:
+    code = await init_db("--fix" in sys.argv[1:])
+    await close_db()
+    return code
+
+if __name__ == '__main__':
+   sys.exit(asyncio.run(mig()))
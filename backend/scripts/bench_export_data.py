@@ -0,0 +1,68 @@
+import sys
+
+sys.path.append('.')
+
+import asyncio
+import time
+from uuid import UUID
+
+from beanie import init_beanie
+
+from app import crud, schemas
+from app.core.config import settings
+from app.db.session import mongo_session
+from app.models.data import Data
+from app.util import export
+
+
+"""
+对比导出数据的两种方式：
+    1. Beanie 文档 -> DoData 校验 -> model_dump_json，字符串拼接
+    2. 原始文档 -> DocumentSerializer -> orjson，写入复用的缓冲区
+用法: python scripts/bench_export_data.py <task_id>
+"""
+
+
+async def export_by_pydantic(task_id: UUID) -> int:
+    size = 0
+    datas = ""
+    index = 0
+    async for data in crud.data.query(task_id=task_id):
+        index += 1
+        datas += (
+            schemas.data.DoData.model_validate(data, from_attributes=True).model_dump_json()
+            + "\n"
+        )
+        if index % 100 == 0:
+            size += len(datas.encode("utf-8"))
+            datas = ""
+    return size + len(datas.encode("utf-8"))
+
+
+async def export_by_raw(task_id: UUID) -> int:
+    size = 0
+    async for chunk in export.stream_jsonl(
+        crud.data.query(task_id=task_id),
+        export.DocumentSerializer(schemas.data.DoData),
+    ):
+        size += len(chunk)
+    return size
+
+
+async def main(task_id: UUID):
+    await init_beanie(
+        database=mongo_session[settings.MongoDB_DB_NAME],
+        document_models=[Data],  # type: ignore
+    )
+    count = await crud.data.query(task_id=task_id).count()
+    print(f"task {task_id}: {count} datas")
+
+    for name, func in (("pydantic", export_by_pydantic), ("raw", export_by_raw)):
+        start = time.perf_counter()
+        size = await func(task_id)
+        cost = time.perf_counter() - start
+        print(f"{name:<10}{cost:>10.2f}s{size / 1024 / 1024:>12.1f}MB{count / cost:>12.0f} docs/s")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(UUID(sys.argv[1])))
@@ -0,0 +1,197 @@
+import itertools
+import random
+from uuid import UUID
+
+import pytest
+
+from app.schemas.operator.stats import (
+    ANSWER_SCOPE,
+    BOOL_OPERATOR,
+    CHOICE_KIND,
+    FilterAnswerOption,
+)
+from app.util.questionnaire_filter import (
+    PLACEHOLDER_EVALUATION,
+    QuestionnaireColumns,
+    filter_questionnaire,
+)
+from app.util.stats import MESSAGE_TYPE, QUESTION_TYPE
+
+QUESTIONS = [
+    ("c_enum", ANSWER_SCOPE.CONVERSATION, CHOICE_KIND.ENUM),
+    ("c_array", ANSWER_SCOPE.CONVERSATION, CHOICE_KIND.ARRAY),
+    ("m_enum", ANSWER_SCOPE.MESSAGE, CHOICE_KIND.ENUM),
+    ("m_array", ANSWER_SCOPE.MESSAGE, CHOICE_KIND.ARRAY),
+    ("q_enum", ANSWER_SCOPE.QUESTION, CHOICE_KIND.ENUM),
+    ("q_array", ANSWER_SCOPE.QUESTION, CHOICE_KIND.ARRAY),
+]
+
+
+def _answers(rng: random.Random, kinds: dict[str, CHOICE_KIND]) -> dict:
+    answers = {}
+    for question, kind in kinds.items():
+        if rng.random() < 0.2:
+            continue
+        if kind == CHOICE_KIND.ENUM:
+            answers[question] = rng.choice(["a", "b"])
+        else:
+            answers[question] = rng.sample(["x", "y", "z"], rng.randint(0, 2))
+    return answers
+
+
+def _make_docs(rng: random.Random, questionnaire_count: int) -> list[dict]:
+    conversation = {q: k for q, s, k in QUESTIONS if s == ANSWER_SCOPE.CONVERSATION}
+    message = {q: k for q, s, k in QUESTIONS if s != ANSWER_SCOPE.CONVERSATION}
+    docs = []
+    for _ in range(questionnaire_count):
+        questionnaire_id = UUID(int=rng.getrandbits(128))
+        for _ in range(rng.randint(1, 4)):
+            message_evaluation = {}
+            for i in range(rng.randint(0, 3)):
+                answers = _answers(rng, message)
+                answers["__sys_message_type"] = rng.choice([MESSAGE_TYPE, QUESTION_TYPE])
+                message_evaluation[str(i)] = answers
+            evaluation = {
+                "conversation_evaluation": _answers(rng, conversation),
+                "message_evaluation": message_evaluation or None,
+            }
+            if rng.random() < 0.3:
+                evaluation["questionnaire_evaluation"] = {
+                    "is_invalid_questionnaire": rng.random() < 0.7
+                }
+            docs.append(
+                {
+                    "data_id": UUID(int=rng.getrandbits(128)),
+                    "questionnaire_id": questionnaire_id,
+                    "custom": {"id": str(len(docs))},
+                    "evaluation": evaluation,
+                }
+            )
+    rng.shuffle(docs)
+    return docs
+
+
+def _reference_rows(doc: dict) -> list[dict]:
+    """
+    原聚合管道的结果：接收消息与发送消息的评价两两组合，每个组合一行
+    """
+    evaluation = doc["evaluation"]
+    messages = [
+        v
+        for v in (evaluation.get("message_evaluation") or {}).values()
+        if v.get("__sys_message_type") == MESSAGE_TYPE
+    ] or [PLACEHOLDER_EVALUATION]
+    questions = [
+        v
+        for v in (evaluation.get("message_evaluation") or {}).values()
+        if v.get("__sys_message_type") == QUESTION_TYPE
+    ] or [PLACEHOLDER_EVALUATION]
+    return [
+        {
+            "conversation_evaluation": evaluation.get("conversation_evaluation"),
+            "message_evaluation": m,
+            "question_evaluation": q,
+            "questionnaire_evaluation": evaluation.get("questionnaire_evaluation"),
+        }
+        for m, q in itertools.product(messages, questions)
+    ]
+
+
+def _reference_filter(
+    operator: BOOL_OPERATOR, filters: list[FilterAnswerOption], docs: list[dict]
+) -> list[tuple[UUID, set[UUID]]]:
+    """
+    原 filter_questionnaire 的逐行实现
+    """
+    groups: dict[UUID, list[tuple[dict, UUID]]] = {}
+    for doc in docs:
+        for row in _reference_rows(doc):
+            groups.setdefault(doc["questionnaire_id"], []).append((row, doc["data_id"]))
+
+    ret = []
+    for questionnaire_id in sorted(groups):
+        rows = groups[questionnaire_id]
+        data_ids = [data_id for _, data_id in rows]
+        if 2 > len(set(data_ids)):
+            continue
+        is_invalid_questionnaires = [
+            (row["questionnaire_evaluation"] or {}).get("is_invalid_questionnaire", False)
+            for row, _ in rows
+        ]
+
+        flags = []
+        for predicate in filters:
+            if predicate.scope == ANSWER_SCOPE.CONVERSATION:
+                eval_arr = [row["conversation_evaluation"] or {} for row, _ in rows]
+            elif predicate.scope == ANSWER_SCOPE.MESSAGE:
+                eval_arr = [row["message_evaluation"] or {} for row, _ in rows]
+            else:
+                eval_arr = [row["question_evaluation"] or {} for row, _ in rows]
+
+            ans_by_group: dict[str, list] = {}
+            for i, d in enumerate(eval_arr):
+                if predicate.type == CHOICE_KIND.ARRAY:
+                    ans = "#@#".join(sorted(d.get(predicate.question, [""])))
+                else:
+                    ans = d.get(predicate.question, "__default_empty_answer")
+                ans_by_group.setdefault(ans, []).append(data_ids[i])
+            answer_with_votes = [
+                len(set(ans_by_group[key])) == len(set(data_ids))
+                for key in ans_by_group
+            ]
+
+            if predicate.answer[0] == "equal":
+                flags.append(any(answer_with_votes) or all(is_invalid_questionnaires))
+            else:
+                flags.append(not all(answer_with_votes))
+
+        if operator == BOOL_OPERATOR.OP_AND:
+            if len(flags) == 0 or all(flags):
+                ret.append((questionnaire_id, set(data_ids)))
+        else:
+            if len(flags) > 0 and any(flags):
+                ret.append((questionnaire_id, set(data_ids)))
+    return ret
+
+
+def _random_filters(rng: random.Random) -> list[FilterAnswerOption]:
+    filters = []
+    for question, scope, kind in rng.sample(QUESTIONS, rng.randint(0, 3)):
+        filters.append(
+            FilterAnswerOption(
+                scope=scope,
+                question=question if rng.random() < 0.9 else "unknown",
+                type=kind,
+                answer=[rng.choice(["equal", "not_equal"])],
+            )
+        )
+    return filters
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_filter_questionnaire_matches_reference(seed: int):
+    rng = random.Random(seed)
+    docs = _make_docs(rng, rng.randint(0, 40))
+    for _ in range(10):
+        filters = _random_filters(rng)
+        operator = rng.choice(list(BOOL_OPERATOR))
+        columns = QuestionnaireColumns.from_documents(docs, filters)
+
+        result = [
+            (r.questionnaire_id, set(r.data_ids))
+            for r in filter_questionnaire(operator, filters, columns)
+        ]
+        assert result == _reference_filter(operator, filters, docs)
+
+
+def test_filter_questionnaire_custom_ids():
+    rng = random.Random(0)
+    docs = _make_docs(rng, 20)
+    custom = {doc["data_id"]: doc["custom"]["id"] for doc in docs}
+    columns = QuestionnaireColumns.from_documents(docs, [])
+
+    result = filter_questionnaire(BOOL_OPERATOR.OP_AND, [], columns)
+    assert result
+    for r in result:
+        assert len(r.data_ids) >= 2
+        assert r.custom_ids == [custom[data_id] for data_id in r.data_ids]